@@ -0,0 +1,184 @@
+"""Local stand-in for the Google Drive v3 endpoints used by lambda_function.
+
+Serves files.list, files.get (alt=media, with Range support), changes.getStartPageToken
+and changes.list over HTTP for a folder of synthetic PBJ-shaped CSVs. Admin endpoints
+let the benchmark mutate files between runs and read per-endpoint request counts.
+"""
+import hashlib
+import json
+import random
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FOLDER_ID = "1gtoGpmQetKmrGcy3Yo1zrE2Rf4CuY55e"
+LIST_PAGE_SIZE = 100
+
+# Header of the CMS PBJ daily nurse staffing files
+PBJ_HEADER = [
+    'PROVNUM', 'PROVNAME', 'CITY', 'STATE', 'COUNTY_NAME', 'COUNTY_FIPS', 'CY_Qtr', 'WorkDate', 'MDScensus',
+    'Hrs_RNDON', 'Hrs_RNDON_emp', 'Hrs_RNDON_ctr', 'Hrs_RNadmin', 'Hrs_RNadmin_emp', 'Hrs_RNadmin_ctr',
+    'Hrs_RN', 'Hrs_RN_emp', 'Hrs_RN_ctr', 'Hrs_LPNadmin', 'Hrs_LPNadmin_emp', 'Hrs_LPNadmin_ctr',
+    'Hrs_LPN', 'Hrs_LPN_emp', 'Hrs_LPN_ctr', 'Hrs_CNA', 'Hrs_CNA_emp', 'Hrs_CNA_ctr',
+    'Hrs_NAtrn', 'Hrs_NAtrn_emp', 'Hrs_NAtrn_ctr', 'Hrs_MedAide', 'Hrs_MedAide_emp', 'Hrs_MedAide_ctr',
+]
+STATES = ['AL', 'AZ', 'CA', 'FL', 'GA', 'IL', 'NY', 'OH', 'PA', 'TX']
+
+def generate_pbj_csv(seed, size_bytes):
+    """Build a PBJ-shaped CSV of roughly size_bytes; the seed fixes its content"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(2000):
+        census = rng.randint(20, 200)
+        hours = [f"{rng.uniform(0, 400):.2f}" for _ in range(24)]
+        rows.append(','.join([
+            f"{rng.randint(10000, 999999):06d}", f'"FACILITY {seed % 1000}-{i}, LLC"', 'SPRINGFIELD',
+            rng.choice(STATES), 'Franklin', str(rng.randint(1, 200)), '2024Q2',
+            f"202404{1 + i % 30:02d}", str(census), *hours,
+        ]))
+    block = ('\n'.join(rows) + '\n').encode('utf-8')
+    header = (','.join(PBJ_HEADER) + '\n').encode('utf-8')
+    # The seed row makes every version's checksum distinct even though blocks repeat
+    first = f"{seed:06d},\"SEED {seed}\",X,AL,X,1,2024Q2,20240401,1{',0.00' * 24}\n".encode('utf-8')
+    repeats = max(1, (size_bytes - len(header)) // len(block))
+    return header + first + block * repeats
+
+class FakeDrive:
+    """In-memory Drive folder with a change log"""
+
+    def __init__(self, file_count, size_bytes, seed=0):
+        self.size_bytes = size_bytes
+        self.lock = threading.Lock()
+        self.files = {}
+        self.content = {}
+        self.changes = []
+        self.request_counts = {}
+        self.rng = random.Random(seed)
+        for i in range(file_count):
+            self._write(f"fake{i:05d}", f"PBJ_Daily_Nurse_Staffing_Synthetic_{i:05d}.csv", seed * 100000 + i)
+
+    def _write(self, file_id, name, seed):
+        data = generate_pbj_csv(seed, self.size_bytes)
+        now = datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+        previous = self.files.get(file_id)
+        self.content[file_id] = data
+        self.files[file_id] = {
+            'id': file_id,
+            'name': name,
+            'mimeType': 'text/csv',
+            'parents': [FOLDER_ID],
+            'createdTime': previous['createdTime'] if previous else now,
+            'modifiedTime': now,
+            'md5Checksum': hashlib.md5(data).hexdigest(),
+            'size': str(len(data)),
+            'trashed': False,
+        }
+        self.changes.append(file_id)
+
+    def mutate(self, change_rate, identical_rate=0.0):
+        """Rewrite a fraction of files with new content, and re-save another fraction unchanged"""
+        with self.lock:
+            file_ids = sorted(self.files)
+            changed = self.rng.sample(file_ids, int(len(file_ids) * change_rate))
+            for file_id in changed:
+                self._write(file_id, self.files[file_id]['name'], self.rng.randint(0, 10 ** 9))
+            untouched = [file_id for file_id in file_ids if file_id not in set(changed)]
+            resaved = self.rng.sample(untouched, int(len(file_ids) * identical_rate))
+            for file_id in resaved:
+                self.files[file_id]['modifiedTime'] = datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+                self.changes.append(file_id)
+            return {'changed': len(changed), 'resaved': len(resaved)}
+
+    def count(self, endpoint):
+        with self.lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+def make_handler(drive):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, body, status=200):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path == '/_admin/mutate':
+                self._json(drive.mutate(float(params.get('change_rate', 0)), float(params.get('identical_rate', 0))))
+            elif url.path == '/_admin/reset_stats':
+                with drive.lock:
+                    drive.request_counts.clear()
+                self._json({})
+            else:
+                self._json({'error': {'code': 404, 'message': 'Not found'}}, 404)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            path = url.path
+
+            if path == '/_admin/stats':
+                with drive.lock:
+                    self._json(dict(drive.request_counts))
+            elif path == '/drive/v3/files':
+                drive.count('files.list')
+                start = int(params.get('pageToken') or 0)
+                with drive.lock:
+                    file_ids = sorted(drive.files)
+                    page = [drive.files[file_id] for file_id in file_ids[start:start + LIST_PAGE_SIZE]]
+                body = {'files': page}
+                if start + LIST_PAGE_SIZE < len(file_ids):
+                    body['nextPageToken'] = str(start + LIST_PAGE_SIZE)
+                self._json(body)
+            elif path == '/drive/v3/changes/startPageToken':
+                drive.count('changes.getStartPageToken')
+                with drive.lock:
+                    self._json({'startPageToken': str(len(drive.changes))})
+            elif path == '/drive/v3/changes':
+                drive.count('changes.list')
+                start = int(params['pageToken'])
+                with drive.lock:
+                    changes = [
+                        {'fileId': file_id, 'removed': False, 'file': drive.files[file_id]}
+                        for file_id in drive.changes[start:]
+                    ]
+                    self._json({'changes': changes, 'newStartPageToken': str(len(drive.changes))})
+            elif path.startswith('/drive/v3/files/') and params.get('alt') == 'media':
+                drive.count('files.get_media')
+                with drive.lock:
+                    data = drive.content.get(path.rsplit('/', 1)[1])
+                if data is None:
+                    self._json({'error': {'code': 404, 'message': 'File not found'}}, 404)
+                    return
+                first, last = 0, len(data) - 1
+                range_header = self.headers.get('Range')
+                if range_header:
+                    first_text, last_text = range_header.split('=', 1)[1].split('-', 1)
+                    first, last = int(first_text), min(int(last_text or last), len(data) - 1)
+                chunk = data[first:last + 1]
+                self.send_response(206 if range_header else 200)
+                self.send_header('Content-Type', 'text/csv')
+                self.send_header('Content-Length', str(len(chunk)))
+                self.send_header('Content-Range', f"bytes {first}-{last}/{len(data)}")
+                self.end_headers()
+                self.wfile.write(chunk)
+            else:
+                self._json({'error': {'code': 404, 'message': 'Not found'}}, 404)
+
+    return Handler
+
+def serve(file_count, size_bytes, port_queue, seed=0):
+    """Run the fake Drive until the process is terminated, reporting the bound port on port_queue"""
+    drive = FakeDrive(file_count, size_bytes, seed)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(drive))
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
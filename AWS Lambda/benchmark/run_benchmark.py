@@ -0,0 +1,177 @@
+"""Benchmark process_all_files against a fake Google Drive and an in-process S3 emulator.
+
+Generates N synthetic PBJ-shaped CSVs, runs the ingestion once cold, then mutates a
+fraction of the files and runs it again for each further run. Reports files/s, MB/s,
+peak RSS and the number of Drive and S3 API calls for each run.
+
+Usage:
+    python run_benchmark.py --files 20 --size-mb 5 --change-rate 0.25 --runs 3 --workers 4
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+import urllib.request
+
+import fake_drive
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class PeakRssSampler:
+    """Samples this process's resident set size in a background thread"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self.running = False
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    def current_rss(self):
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * self.page_size
+        except OSError:
+            # ru_maxrss is a lifetime peak in KB on Linux; only used off Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while self.running:
+            self.peak = max(self.peak, self.current_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current_rss()
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.running = False
+        self.thread.join()
+
+def drive_admin(base_url, path, method='GET'):
+    request = urllib.request.Request(base_url + path, method=method, data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--files', type=int, default=20, help='number of synthetic CSV files')
+    parser.add_argument('--size-mb', type=float, default=5, help='approximate size of each file in MB')
+    parser.add_argument('--change-rate', type=float, default=0.25, help='fraction of files rewritten between runs')
+    parser.add_argument('--identical-rate', type=float, default=0.0,
+                        help='fraction of files re-saved with identical content between runs')
+    parser.add_argument('--runs', type=int, default=2, help='number of runs (first run is cold)')
+    parser.add_argument('--workers', type=int, default=4, help='MAX_TRANSFER_WORKERS for the runs')
+    parser.add_argument('--chunk-mb', type=int, default=8, help='TRANSFER_CHUNK_SIZE_MB for the runs')
+    parser.add_argument('--gzip', action='store_true', help='enable GZIP_UPLOADS')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='show the pipeline output')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # The fake Drive runs in its own process so its file contents don't count toward peak RSS
+    port_queue = multiprocessing.Queue()
+    drive_process = multiprocessing.Process(
+        target=fake_drive.serve,
+        args=(args.files, int(args.size_mb * 1024 * 1024), port_queue),
+        daemon=True
+    )
+    drive_process.start()
+    drive_url = f"http://127.0.0.1:{port_queue.get(timeout=120)}"
+
+    os.environ.update({
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'DRIVE_API_ENDPOINT': f"{drive_url}/drive/v3/",
+        'MAX_TRANSFER_WORKERS': str(args.workers),
+        'TRANSFER_CHUNK_SIZE_MB': str(args.chunk_mb),
+        'DRIVE_MAX_REQUESTS_PER_SECOND': '1000',
+        'EMIT_METRICS': 'false',
+        'GZIP_UPLOADS': 'true' if args.gzip else 'false',
+    })
+
+    from google.auth.credentials import AnonymousCredentials
+    from moto import mock_aws
+
+    results = []
+    with mock_aws():
+        sys.path.insert(0, LAMBDA_DIR)
+        import lambda_function
+
+        lambda_function.s3_client.create_bucket(Bucket=lambda_function.BUCKET_NAME)
+        lambda_function.get_drive_credentials = AnonymousCredentials
+
+        s3_calls = {}
+        def count_s3_call(model, **kwargs):
+            s3_calls[model.name] = s3_calls.get(model.name, 0) + 1
+        lambda_function.s3_client.meta.events.register('before-call.s3', count_s3_call)
+
+        for run in range(args.runs):
+            mutation = None
+            if run > 0:
+                mutation = drive_admin(
+                    drive_url,
+                    f"/_admin/mutate?change_rate={args.change_rate}&identical_rate={args.identical_rate}",
+                    'POST'
+                )
+            drive_admin(drive_url, '/_admin/reset_stats', 'POST')
+            s3_calls.clear()
+
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with PeakRssSampler() as rss, output:
+                started = time.perf_counter()
+                summary = lambda_function.process_all_files(max_workers=args.workers)
+                elapsed = time.perf_counter() - started
+
+            processed = summary['processed']
+            # Total time per phase from the Lambda's metric records (per-file phases overlap across workers)
+            phases = {}
+            for record in lambda_function.metric_records:
+                phases[record['Phase']] = round(phases.get(record['Phase'], 0) + record.get('DurationMs', 0), 1)
+            megabytes = sum(item['size'] for item in processed) / (1024 * 1024)
+            results.append({
+                'run': run + 1,
+                'mutation': mutation,
+                'seconds': round(elapsed, 3),
+                'files_processed': len(processed),
+                'files_skipped': summary.get('skipped', 0) + summary.get('identical', 0),
+                'files_failed': summary.get('failed', 0),
+                'megabytes': round(megabytes, 2),
+                'compression_ratio': summary.get('compression_ratio'),
+                'files_per_second': round(len(processed) / elapsed, 2),
+                'megabytes_per_second': round(megabytes / elapsed, 2),
+                'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+                'drive_calls': drive_admin(drive_url, '/_admin/stats'),
+                's3_calls': dict(s3_calls),
+                'phase_ms': phases,
+            })
+
+    drive_process.terminate()
+
+    print(f"{'run':>3} {'files':>6} {'skipped':>7} {'failed':>6} {'MB':>8} {'sec':>7} "
+          f"{'files/s':>8} {'MB/s':>7} {'peakRSS':>8}  API calls")
+    for result in results:
+        calls = dict(result['drive_calls'], **{f"s3.{name}": count for name, count in result['s3_calls'].items()})
+        print(f"{result['run']:>3} {result['files_processed']:>6} {result['files_skipped']:>7} "
+              f"{result['files_failed']:>6} {result['megabytes']:>8.1f} {result['seconds']:>7.2f} "
+              f"{result['files_per_second']:>8.2f} {result['megabytes_per_second']:>7.1f} "
+              f"{result['peak_rss_mb']:>7.1f}M  {json.dumps(calls, sort_keys=True)}")
+        print(f"    phase ms: {json.dumps(result['phase_ms'], sort_keys=True)}")
+
+    if args.json:
+        with open(args.json, 'w') as output_file:
+            json.dump({'args': vars(args), 'runs': results}, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
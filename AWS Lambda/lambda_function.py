@@ -1,52 +1,465 @@
 import google.auth
+import google.auth.transport.requests
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import io
+import gzip
+import zlib
+import csv
+import time
+import random
+import hashlib
+import httplib2
 from googleapiclient.http import MediaIoBaseDownload
 import boto3
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 import json 
+import os
+import threading
+from collections.abc import MutableMapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from google.oauth2 import service_account
 from datetime import datetime
+from decimal import Decimal
+
+try:
+    # Only needed for the optional Parquet stage; ship pyarrow as a Lambda layer to enable it
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 # Global clients for efficiency - created once, reused across invocations
-s3_client = boto3.client('s3')
+# S3 uses botocore's adaptive retry mode, which rate-limits itself on throttling responses
+s3_client = boto3.client('s3', config=Config(retries={'max_attempts': 10, 'mode': 'adaptive'}))
 secrets_client = boto3.client('secretsmanager')
+lambda_client = boto3.client('lambda')
+
+# Google credentials and idle Drive clients, cached across warm invocations.
+# Drive clients are not thread-safe, so each one is used by a single thread at a time.
+_drive_credentials = None
+_drive_services = []
+_drive_lock = threading.Lock()
 
 # Configuration constants
 BUCKET_NAME = "healthcare-data-lake-dea-2025"
 STATE_KEY = "state/last_run_state.json"
+# Per-file entries live in shards keyed by a prefix of md5(filename): state/files/<prefix>.json
+STATE_SHARD_PREFIX = "state/files/"
+STATE_SHARD_PREFIX_LENGTH = 2
+STATE_WRITE_ATTEMPTS = 5
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+DRIVE_FOLDER_ID = "1gtoGpmQetKmrGcy3Yo1zrE2Rf4CuY55e"
+USE_DRIVE_CHANGES = os.environ.get('USE_DRIVE_CHANGES', 'true').lower() == 'true'
+# Points the Drive client at another host, e.g. the local fake Drive in benchmark/
+DRIVE_API_ENDPOINT = os.environ.get('DRIVE_API_ENDPOINT')
+CONVERT_TO_PARQUET = os.environ.get('CONVERT_TO_PARQUET', 'false').lower() == 'true'
+PARQUET_PREFIX = "parquet/"
+PARQUET_BLOCK_SIZE = int(os.environ.get('PARQUET_BLOCK_SIZE_MB', '16')) * 1024 * 1024
+# Each run lists the objects it wrote in manifests/<run timestamp>.json for manifest_loader.py
+WRITE_MANIFESTS = os.environ.get('WRITE_MANIFESTS', 'true').lower() == 'true'
+MANIFEST_PREFIX = "manifests/"
+
+# Columns of the BRONZE.PBJ_Daily_Nurse_Staffing_* tables (snowflake/healthcare-setup.sql), in file order
+PBJ_BRONZE_COLUMNS = [
+    ('PROVNUM', 'VARCHAR'), ('PROVNAME', 'VARCHAR'), ('CITY', 'VARCHAR'), ('STATE', 'VARCHAR'),
+    ('COUNTY_NAME', 'VARCHAR'), ('COUNTY_FIPS', 'NUMBER(10,2)'), ('CY_Qtr', 'VARCHAR'),
+    ('WORKDATE', 'DATE'), ('MDSCENSUS', 'NUMBER'),
+    ('HRS_RNDON', 'NUMBER(10,2)'), ('HRS_RNDON_tmp', 'NUMBER(10,2)'), ('HRS_RNDON_ctr', 'NUMBER(10,2)'),
+    ('HRS_RNADMIN', 'NUMBER(10,2)'), ('HRS_RNADMIN_emp', 'NUMBER(10,2)'), ('HRS_RNADMIN_ctr', 'NUMBER(10,2)'),
+    ('HRS_RN', 'NUMBER(10,2)'), ('HRS_RN_emp', 'NUMBER(10,2)'), ('HRS_RN_ctr', 'NUMBER(10,2)'),
+    ('HRS_LPNADMIN', 'NUMBER(10,2)'), ('HRS_LPNADMIN_emp', 'NUMBER(10,2)'), ('HRS_LPNADMIN_ctr', 'NUMBER(10,2)'),
+    ('HRS_LPN', 'NUMBER(10,2)'), ('HRS_LPN_emp', 'NUMBER(10,2)'), ('HRS_LPN_ctr', 'NUMBER(10,2)'),
+    ('HRS_CNA', 'NUMBER(10,2)'), ('HRS_CNA_emp', 'NUMBER(10,2)'), ('HRS_CNA_ctr', 'NUMBER(10,2)'),
+    ('HRS_NATRN', 'NUMBER(10,2)'), ('HRS_NATRN_emp', 'NUMBER(10,2)'), ('HRS_NATRN_ctr', 'NUMBER(10,2)'),
+    ('HRS_MEDAIDE', 'NUMBER(10,2)'), ('HRS_MEDAIDE_emp', 'NUMBER(10,2)'), ('HRS_MEDAIDE_ctr', 'NUMBER(10,2)'),
+]
+NUMBER_TEXT_PATTERN = r'^(?P<sign>[+-]?)(?P<integer>\d*)(?:\.(?P<fraction>\d*))?$'
+MAX_TRANSFER_WORKERS = int(os.environ.get('MAX_TRANSFER_WORKERS', '4'))
+STREAM_UPLOADS = os.environ.get('STREAM_UPLOADS', 'true').lower() == 'true'
+# Drive API retry and rate-limit settings
+DRIVE_MAX_RETRIES = int(os.environ.get('DRIVE_MAX_RETRIES', '8'))
+DRIVE_RETRY_BASE_SECONDS = 1.0
+DRIVE_RETRY_MAX_SECONDS = 64.0
+DRIVE_MAX_REQUESTS_PER_SECOND = float(os.environ.get('DRIVE_MAX_REQUESTS_PER_SECOND', '10'))
+DRIVE_MIN_REQUESTS_PER_SECOND = 0.5
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+THROTTLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, httplib2.HttpLib2Error)
+# Stop starting new transfers once less than this much Lambda time is left
+TIME_BUDGET_MARGIN_SECONDS = int(os.environ.get('TIME_BUDGET_MARGIN_SECONDS', '120'))
+CHECKPOINT_INTERVAL_SECONDS = int(os.environ.get('CHECKPOINT_INTERVAL_SECONDS', '60'))
+AUTO_CONTINUE = os.environ.get('AUTO_CONTINUE', 'false').lower() == 'true'
+MAX_CHAINED_INVOCATIONS = int(os.environ.get('MAX_CHAINED_INVOCATIONS', '20'))
+# Gzip CSVs on the fly and store them as data/<filename>.gz (Snowflake's CSV format reads gzip directly)
+GZIP_UPLOADS = os.environ.get('GZIP_UPLOADS', 'false').lower() == 'true'
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+# Drive download chunk and S3 part size; S3 requires parts of at least 5MB
+TRANSFER_CHUNK_SIZE = max(int(os.environ.get('TRANSFER_CHUNK_SIZE_MB', '8')), 5) * 1024 * 1024
+
+# Per-phase metrics are printed as CloudWatch embedded-metric-format (EMF) JSON
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'HealthcarePipeline')
+EMIT_METRICS = os.environ.get('EMIT_METRICS', 'true').lower() == 'true'
+
+# Guards shared pipeline state when files are transferred concurrently
+state_lock = threading.Lock()
+
+# Local sink holding every metric record of the current run (read by the benchmark and tests)
+metric_records = []
+metrics_lock = threading.Lock()
+
+def reset_metrics():
+    """Clear the local metric sink at the start of a run (it persists across warm invocations)"""
+    with metrics_lock:
+        metric_records.clear()
+
+def emit_metrics(phase, metrics, **properties):
+    """Record one phase's metrics as an EMF record: print it for CloudWatch and keep it in metric_records.
+
+    metrics maps metric name -> (value, unit); properties (e.g. File) are logged but not dimensions.
+    """
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Phase']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()]
+            }]
+        },
+        'Phase': phase,
+        **properties,
+        **{name: value for name, (value, _) in metrics.items()}
+    }
+    with metrics_lock:
+        metric_records.append(record)
+    if EMIT_METRICS:
+        print(json.dumps(record))
+    return record
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+@contextmanager
+def timed(phase, **properties):
+    """Time a block as a pipeline phase; the caller may add metrics to the yielded dict"""
+    metrics = {}
+    started = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        emit_metrics(phase, dict(DurationMs=(elapsed_ms(started), 'Milliseconds'), **metrics), **properties)
+
+class AdaptiveRateLimiter:
+    """Paces requests shared by all threads: halves the rate on throttling, recovers it additively"""
+
+    def __init__(self, max_rate, min_rate):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate = max_rate
+        self.next_allowed = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait for the next request slot, returning the seconds spent waiting"""
+        with self.lock:
+            now = time.monotonic()
+            wait_seconds = max(0.0, self.next_allowed - now)
+            self.next_allowed = max(now, self.next_allowed) + 1.0 / self.rate
+        if wait_seconds:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + 0.1 * self.max_rate)
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+drive_rate_limiter = AdaptiveRateLimiter(DRIVE_MAX_REQUESTS_PER_SECOND, DRIVE_MIN_REQUESTS_PER_SECOND)
+retry_stats = {'retries': 0, 'throttled_responses': 0, 'throttle_seconds': 0.0}
+retry_stats_lock = threading.Lock()
+
+def reset_retry_stats():
+    """Zero the retry counters at the start of a run (they persist across warm invocations)"""
+    with retry_stats_lock:
+        retry_stats.update(retries=0, throttled_responses=0, throttle_seconds=0.0)
+
+def record_retry_stats(retries=0, throttled_responses=0, throttle_seconds=0.0):
+    with retry_stats_lock:
+        retry_stats['retries'] += retries
+        retry_stats['throttled_responses'] += throttled_responses
+        retry_stats['throttle_seconds'] += throttle_seconds
+
+def is_throttle_error(error):
+    """Check if a Drive HttpError is a rate-limit response"""
+    if error.resp.status == 429:
+        return True
+    if error.resp.status != 403:
+        return False
+    details = error.error_details if isinstance(error.error_details, list) else []
+    reasons = {detail.get('reason') for detail in details if isinstance(detail, dict)}
+    return bool(reasons & THROTTLE_REASONS) or any(reason in str(error) for reason in THROTTLE_REASONS)
+
+def call_with_retry(request_fn, description):
+    """Call a Drive API function through the shared rate limiter.
+
+    Throttling, 5xx and connection errors are retried with exponential backoff
+    and full jitter. Download chunks retried this way resume from the last
+    received byte, because MediaIoBaseDownload only advances on success.
+    """
+    for attempt in range(DRIVE_MAX_RETRIES + 1):
+        # Pacing waits are not throttling; only backoff after a 403/429 counts toward throttle_seconds
+        drive_rate_limiter.acquire()
+        try:
+            result = request_fn()
+            drive_rate_limiter.on_success()
+            return result
+        except HttpError as error:
+            throttled = is_throttle_error(error)
+            if attempt == DRIVE_MAX_RETRIES or not (throttled or error.resp.status in RETRYABLE_STATUS_CODES):
+                raise
+            last_error = error
+        except TRANSIENT_ERRORS as error:
+            if attempt == DRIVE_MAX_RETRIES:
+                raise
+            throttled = False
+            last_error = error
+
+        delay = random.uniform(0, min(DRIVE_RETRY_MAX_SECONDS, DRIVE_RETRY_BASE_SECONDS * 2 ** attempt))
+        if throttled:
+            drive_rate_limiter.on_throttle()
+            record_retry_stats(retries=1, throttled_responses=1, throttle_seconds=delay)
+        else:
+            record_retry_stats(retries=1)
+        print(f"Retrying {description} in {delay:.1f}s (attempt {attempt + 1}/{DRIVE_MAX_RETRIES}): {last_error}")
+        time.sleep(delay)
 
 def get_google_credentials():
     """Retrieve Google service account credentials from AWS Secrets Manager"""
     secret_value = secrets_client.get_secret_value(SecretId='healthcare-pipeline-google-creds')
     return json.loads(secret_value['SecretString'])
 
-def load_state_file():
-    """Load pipeline state from S3, return default if doesn't exist"""
+def get_drive_credentials():
+    """Return cached service account credentials, refreshing the token once it has expired"""
+    global _drive_credentials
+    with _drive_lock:
+        if _drive_credentials is None:
+            with timed('secrets'):
+                google_creds_json = get_google_credentials()
+            _drive_credentials = service_account.Credentials.from_service_account_info(
+                google_creds_json, scopes=DRIVE_SCOPES
+            )
+        if not _drive_credentials.valid:
+            with timed('token_refresh'):
+                _drive_credentials.refresh(google.auth.transport.requests.Request())
+        return _drive_credentials
+
+@contextmanager
+def drive_service():
+    """Check out a cached Drive client, building one from the bundled discovery document if none is idle"""
+    creds = get_drive_credentials()
+    with _drive_lock:
+        service = _drive_services.pop() if _drive_services else None
+    if service is None:
+        # static_discovery uses the drive v3 document shipped with google-api-python-client
+        service = build(
+            "drive", "v3", credentials=creds, static_discovery=True, cache_discovery=False,
+            client_options={'api_endpoint': DRIVE_API_ENDPOINT} if DRIVE_API_ENDPOINT else None
+        )
     try:
-        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=STATE_KEY)
-        file_content = response['Body'].read().decode('utf-8')
-        return json.loads(file_content)
+        yield service
+    finally:
+        with _drive_lock:
+            _drive_services.append(service)
+
+def is_precondition_failure(error):
+    """Check if an S3 error means a conditional write lost a race with another writer"""
+    return error.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict')
+
+def get_state_object(s3_key):
+    """Read a JSON state object from S3, returning (data, ETag) or (None, None) if it doesn't exist"""
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key)
     except ClientError as e:
         if e.response['Error']['Code'] == 'NoSuchKey':
-            print("State file not found - first run, using default state")
-            return {"last_pipeline_run": None, "files": {}}
-        else:
-            print(f"S3 error loading state file: {e}")
-            raise e
+            return None, None
+        raise e
+    return json.loads(response['Body'].read().decode('utf-8')), response['ETag']
+
+def put_state_object(s3_key, data, etag):
+    """Write a JSON state object only if it is unchanged since it was read (etag None = must not exist)"""
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    response = s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=s3_key,
+        Body=json.dumps(data, separators=(',', ':'), sort_keys=True),
+        ContentType='application/json',
+        **condition
+    )
+    return response['ETag']
+
+def merge_file_entries(remote_entries, local_entries):
+    """Merge two versions of a shard, keeping the most recently processed entry per file"""
+    merged = dict(remote_entries)
+    for filename, entry in local_entries.items():
+        remote_entry = merged.get(filename)
+        if remote_entry is None or (entry.get('last_processed') or '') >= (remote_entry.get('last_processed') or ''):
+            merged[filename] = entry
+    return merged
+
+class ShardedFileState(MutableMapping):
+    """Per-file pipeline state, stored in S3 shards keyed by a prefix of md5(filename).
+
+    Shards are read on first access and only shards with changes are written
+    back, so load and save cost follows the files a run touches rather than
+    the whole history. Writes are ETag-conditional; when another run wrote a
+    shard in the meantime, its entries are merged in and the write is retried.
+    Callers serialize access through state_lock.
+    """
+
+    def __init__(self):
+        self.shards = {}
+        self.etags = {}
+        self.dirty = set()
+
+    @staticmethod
+    def shard_for(filename):
+        return hashlib.md5(filename.encode('utf-8')).hexdigest()[:STATE_SHARD_PREFIX_LENGTH]
+
+    def _shard(self, filename):
+        prefix = self.shard_for(filename)
+        if prefix not in self.shards:
+            self.load_shard(prefix)
+        return self.shards[prefix]
+
+    def load_shard(self, prefix):
+        data, etag = get_state_object(f"{STATE_SHARD_PREFIX}{prefix}.json")
+        self.shards[prefix] = data or {}
+        self.etags[prefix] = etag
+
+    def preload(self, filenames):
+        """Load the shards for a batch of files concurrently"""
+        prefixes = {self.shard_for(filename) for filename in filenames} - set(self.shards)
+        results = {}
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for prefix, result in zip(prefixes, executor.map(
+                    lambda prefix: get_state_object(f"{STATE_SHARD_PREFIX}{prefix}.json"), prefixes)):
+                results[prefix] = result
+        for prefix, (data, etag) in results.items():
+            self.shards[prefix] = data or {}
+            self.etags[prefix] = etag
+
+    def __getitem__(self, filename):
+        return self._shard(filename)[filename]
+
+    def __setitem__(self, filename, entry):
+        self._shard(filename)[filename] = entry
+        self.dirty.add(self.shard_for(filename))
+
+    def __delitem__(self, filename):
+        del self._shard(filename)[filename]
+        self.dirty.add(self.shard_for(filename))
+
+    def __contains__(self, filename):
+        return filename in self._shard(filename)
+
+    def __iter__(self):
+        # Full iteration needs every shard; the pipeline itself never does this
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=STATE_SHARD_PREFIX):
+            for obj in page.get('Contents', []):
+                prefix = obj['Key'][len(STATE_SHARD_PREFIX):-len('.json')]
+                if prefix not in self.shards:
+                    self.load_shard(prefix)
+        for shard in list(self.shards.values()):
+            yield from list(shard)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def save(self):
+        """Write changed shards, merging with concurrent writers; returns the number of shards written"""
+        written = 0
+        for prefix in sorted(self.dirty):
+            s3_key = f"{STATE_SHARD_PREFIX}{prefix}.json"
+            for attempt in range(STATE_WRITE_ATTEMPTS):
+                try:
+                    self.etags[prefix] = put_state_object(s3_key, self.shards[prefix], self.etags.get(prefix))
+                    break
+                except ClientError as e:
+                    if not is_precondition_failure(e) or attempt == STATE_WRITE_ATTEMPTS - 1:
+                        raise e
+                    print(f"State shard {prefix} changed by another run - merging and retrying")
+                    remote, self.etags[prefix] = get_state_object(s3_key)
+                    self.shards[prefix] = merge_file_entries(remote or {}, self.shards[prefix])
+            written += 1
+        self.dirty.clear()
+        return written
+
+def load_state_file():
+    """Load pipeline state from S3, return default if doesn't exist.
+
+    The root state file holds run-level fields only; state['files'] reads the
+    per-file shards lazily. A legacy root file with inline 'files' is migrated
+    to shards on the next save.
+    """
+    try:
+        root, etag = get_state_object(STATE_KEY)
+    except ClientError as e:
+        print(f"S3 error loading state file: {e}")
+        raise e
+
+    files = ShardedFileState()
+    if root is None:
+        print("State file not found - first run, using default state")
+        root = {"last_pipeline_run": None}
+    elif 'files' in root:
+        print(f"Migrating {len(root['files'])} legacy state entries to sharded state")
+        files.preload(root['files'])
+        for filename, entry in root.pop('files').items():
+            files[filename] = entry
+    root['files'] = files
+    root['_etag'] = etag
+    return root
 
 def save_state_file(state_data):
-    """Save pipeline state to S3"""
+    """Save pipeline state to S3: changed file shards first, then the compact root file"""
     try:
-        state_json = json.dumps(state_data, indent=2)
-        s3_client.put_object(
-            Bucket=BUCKET_NAME,
-            Key=STATE_KEY,
-            Body=state_json,
-            ContentType='application/json'
-        )
-        print(f"State file saved to s3://{BUCKET_NAME}/{STATE_KEY}")
+        # Hold the lock so in-flight transfers can't change state mid-save
+        with state_lock, timed('save_state') as metrics:
+            shards_written = state_data['files'].save()
+            root = {key: value for key, value in state_data.items() if key not in ('files', '_etag')}
+            for attempt in range(STATE_WRITE_ATTEMPTS):
+                try:
+                    state_data['_etag'] = put_state_object(STATE_KEY, root, state_data.get('_etag'))
+                    break
+                except ClientError as e:
+                    if not is_precondition_failure(e) or attempt == STATE_WRITE_ATTEMPTS - 1:
+                        raise e
+                    print("State file changed by another run - merging and retrying")
+                    remote, state_data['_etag'] = get_state_object(STATE_KEY)
+                    remote = remote or {}
+                    remote.pop('files', None)
+                    local = root
+                    root = dict(remote, **local)
+                    # Keep the change token set most recently, so a stale run can't move it backwards
+                    if (remote.get('drive_changes_token_updated') or '') > (local.get('drive_changes_token_updated') or ''):
+                        root['drive_changes_page_token'] = remote.get('drive_changes_page_token')
+                        root['drive_changes_token_updated'] = remote['drive_changes_token_updated']
+                    # Keep the latest run timestamp of the two runs
+                    root['last_pipeline_run'] = max(
+                        filter(None, [remote.get('last_pipeline_run'), root.get('last_pipeline_run')]),
+                        default=None
+                    )
+            metrics['ShardsWritten'] = (shards_written, 'Count')
+        print(f"State file saved to s3://{BUCKET_NAME}/{STATE_KEY} ({shards_written} shards updated)")
         return True
     except ClientError as e:
         print(f"Error saving state file: {e}")
@@ -62,8 +475,14 @@ def should_process_file(file_info, state_data):
         print(f"New file detected: {filename}")
         return True
     
+    # GZIP_UPLOADS was toggled since the last upload: the object has to be written under the new key
+    entry = state_data['files'][filename]
+    if stored_key(entry, filename) != s3_key_for(filename):
+        print(f"Upload key changed: {filename} ({stored_key(entry, filename)} -> {s3_key_for(filename)})")
+        return True
+
     # Compare modified times (ISO strings can be compared directly)
-    last_processed_time = state_data['files'][filename].get('last_processed')
+    last_processed_time = entry.get('last_processed')
     if not last_processed_time or drive_modified_time > last_processed_time:
         print(f"File changed: {filename} (Drive: {drive_modified_time}, Last: {last_processed_time})")
         return True
@@ -72,73 +491,163 @@ def should_process_file(file_info, state_data):
     return False
 
 def update_file_state(state_data, file_info, current_time):
-    """Update state for successfully processed file"""
+    """Update state for successfully processed file (safe to call from worker threads)"""
     filename = file_info.get('name')
-    state_data['files'][filename] = {
-        'file_id': file_info.get('id'),
-        'last_modified_in_drive': file_info.get('modifiedTime'),
-        'last_processed': current_time
-    }
+    with state_lock:
+        state_data['files'][filename] = {
+            'file_id': file_info.get('id'),
+            'last_modified_in_drive': file_info.get('modifiedTime'),
+            'last_processed': current_time,
+            'md5_checksum': file_info.get('md5Checksum'),
+            'size': int(file_info.get('size') or 0),
+            's3_key': s3_key_for(filename)
+        }
+
+def s3_key_for(filename):
+    """S3 key a Drive file is uploaded to"""
+    return f"data/{filename}.gz" if GZIP_UPLOADS else f"data/{filename}"
+
+def stored_key(entry, filename):
+    """S3 key a file's state entry was uploaded to (entries from before keys were recorded are uncompressed)"""
+    return entry.get('s3_key') or f"data/{filename}"
+
+def upload_options(metadata):
+    """Extra put_object / create_multipart_upload arguments for an uploaded CSV"""
+    options = {'Metadata': metadata, 'ContentType': 'text/csv'}
+    if GZIP_UPLOADS:
+        options['ContentEncoding'] = 'gzip'
+    return options
+
+def is_content_unchanged(file_info, state_data):
+    """Check if a changed file's bytes match what was last uploaded (by Drive md5Checksum)"""
+    filename = file_info.get('name')
+    drive_md5 = file_info.get('md5Checksum')
+    if not drive_md5:
+        return False
+
+    entry = state_data['files'].get(filename)
+    # The key changes with GZIP_UPLOADS, so an identical file still has to be written under the new key
+    if entry and entry.get('md5_checksum') == drive_md5 and stored_key(entry, filename) == s3_key_for(filename):
+        print(f"File re-saved with identical content, skipping: {filename}")
+        return True
+
+    # Not in state (or stale): compare against the object already in S3
+    try:
+        response = s3_client.head_object(Bucket=BUCKET_NAME, Key=s3_key_for(filename))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise e
+    s3_md5 = response.get('Metadata', {}).get('drive-md5') or response.get('ETag', '').strip('"')
+    if s3_md5 == drive_md5:
+        print(f"File already in S3 with identical content, skipping: {filename}")
+        return True
+    return False
 
 def search_file():
     """Search file in drive location"""
-    google_creds_json = get_google_credentials()
-    creds = service_account.Credentials.from_service_account_info(google_creds_json)
-    
     try:
-        service = build("drive", "v3", credentials=creds)
-        files = []
-        page_token = None
-        while True:
-            response = (
-                service.files()
-                .list(
-                    q="'1gtoGpmQetKmrGcy3Yo1zrE2Rf4CuY55e' in parents and mimeType='text/csv'",
+        with drive_service() as service:
+            files = []
+            page_token = None
+            while True:
+                request = service.files().list(
+                    q=f"'{DRIVE_FOLDER_ID}' in parents and mimeType='text/csv'",
                     spaces="drive",
-                    fields="nextPageToken, files(id, name, mimeType, modifiedTime, createdTime)",
+                    fields="nextPageToken, files(id, name, mimeType, modifiedTime, createdTime, md5Checksum, size)",
                     pageToken=page_token,
                 )
-                .execute()
-            )
-            for file in response.get("files", []):
-                print(f'Found file: {file.get("name")}, Modified: {file.get("modifiedTime")}')
-            files.extend(response.get("files", []))
-            page_token = response.get("nextPageToken", None)
-            if page_token is None:
-                break
-    except HttpError as error:
+                response = call_with_retry(request.execute, "listing files")
+                for file in response.get("files", []):
+                    print(f'Found file: {file.get("name")}, Modified: {file.get("modifiedTime")}')
+                files.extend(response.get("files", []))
+                page_token = response.get("nextPageToken", None)
+                if page_token is None:
+                    break
+    except (HttpError, *TRANSIENT_ERRORS) as error:
         print(f"An error occurred: {error}")
         files = None
     return files
 
+def get_start_page_token():
+    """Get the Drive changes page token for "now", or None if it can't be fetched"""
+    try:
+        with drive_service() as service:
+            response = call_with_retry(service.changes().getStartPageToken().execute, "getting changes start token")
+        return response.get('startPageToken')
+    except (HttpError, *TRANSIENT_ERRORS) as error:
+        print(f"An error occurred getting changes start token: {error}")
+        return None
+
+def is_tracked_file(file):
+    """Check if a changed Drive file is a live CSV in the pipeline folder"""
+    return (
+        file is not None
+        and not file.get('trashed', False)
+        and file.get('mimeType') == 'text/csv'
+        and DRIVE_FOLDER_ID in file.get('parents', [])
+    )
+
+def search_changes(page_token):
+    """List CSV files in the drive folder changed since page_token.
+
+    Returns (files, new_start_page_token), or (None, None) if the token was
+    rejected (e.g. expired) and the caller should fall back to a full scan.
+    """
+    try:
+        with drive_service() as service:
+            changed = {}
+            new_start_page_token = None
+            while page_token is not None:
+                request = service.changes().list(
+                    pageToken=page_token,
+                    spaces="drive",
+                    pageSize=1000,
+                    fields="nextPageToken, newStartPageToken, "
+                           "changes(fileId, removed, file(id, name, mimeType, modifiedTime, createdTime, md5Checksum, size, parents, trashed))",
+                )
+                response = call_with_retry(request.execute, "listing changes")
+                for change in response.get("changes", []):
+                    file = change.get("file")
+                    if not change.get("removed") and is_tracked_file(file):
+                        # A file can change several times; the latest entry wins
+                        changed[file['id']] = file
+                new_start_page_token = response.get("newStartPageToken", new_start_page_token)
+                page_token = response.get("nextPageToken", None)
+    except (HttpError, *TRANSIENT_ERRORS) as error:
+        print(f"An error occurred listing changes: {error}")
+        return None, None
+
+    for file in changed.values():
+        print(f'Changed file: {file.get("name")}, Modified: {file.get("modifiedTime")}')
+    return list(changed.values()), new_start_page_token
+
 def download_file(file_id, filename):
     """Downloads a file from Google Drive"""
-    google_creds_json = get_google_credentials()
-    creds = service_account.Credentials.from_service_account_info(google_creds_json)
-
     try:
-        service = build("drive", "v3", credentials=creds)
-        request = service.files().get_media(fileId=file_id)
-        file = io.BytesIO()
-        downloader = MediaIoBaseDownload(file, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-            print(f"Download {int(status.progress() * 100)}%")
+        with drive_service() as service:
+            request = service.files().get_media(fileId=file_id)
+            file = io.BytesIO()
+            downloader = MediaIoBaseDownload(file, request)
+            done = False
+            while done is False:
+                status, done = call_with_retry(downloader.next_chunk, f"downloading {filename}")
+                print(f"Download {int(status.progress() * 100)}%")
 
         print(f"Successfully downloaded {filename}")
         return file.getvalue()
-    except HttpError as error:
+    except (HttpError, *TRANSIENT_ERRORS) as error:
         print(f"An error occurred downloading {filename}: {error}")
         return None
 
-def upload_to_s3(file_data, filename, s3_key):
+def upload_to_s3(file_data, filename, s3_key, metadata=None):
     """Upload file data to S3 using global client"""
     try:
         s3_client.put_object(
             Bucket=BUCKET_NAME,
             Key=s3_key,
-            Body=file_data
+            Body=file_data,
+            **upload_options(metadata or {})
         )
         print(f"Successfully uploaded {filename} to s3://{BUCKET_NAME}/{s3_key}")
         return True             
@@ -146,82 +655,732 @@ def upload_to_s3(file_data, filename, s3_key):
         print(f"Error uploading {filename}: {e}")
         return False
 
-def process_all_files():
-    """Download only changed CSV files from Google Drive with state management"""
+class S3MultipartWriter:
+    """Write-only file object that streams bytes into an S3 multipart upload.
+
+    At most one part buffer is held in memory at a time. Objects smaller than
+    one part are sent with a single put_object when the writer is closed.
+    """
+
+    def __init__(self, s3_key, part_size=TRANSFER_CHUNK_SIZE, **put_kwargs):
+        self.s3_key = s3_key
+        self.part_size = part_size
+        self.put_kwargs = put_kwargs
+        self.upload_id = None
+        self.parts = []
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.upload_seconds = 0.0
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        self.buffer += data
+        self.bytes_written += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def _upload_part(self, part_data):
+        started = time.perf_counter()
+        if self.upload_id is None:
+            response = s3_client.create_multipart_upload(
+                Bucket=BUCKET_NAME, Key=self.s3_key, **self.put_kwargs
+            )
+            self.upload_id = response['UploadId']
+        part_number = len(self.parts) + 1
+        response = s3_client.upload_part(
+            Bucket=BUCKET_NAME,
+            Key=self.s3_key,
+            PartNumber=part_number,
+            UploadId=self.upload_id,
+            Body=part_data
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+        self.upload_seconds += time.perf_counter() - started
+
+    def close(self):
+        """Send any buffered bytes and finish the upload"""
+        if self.closed:
+            return
+        started = time.perf_counter()
+        if self.upload_id is None:
+            s3_client.put_object(
+                Bucket=BUCKET_NAME, Key=self.s3_key, Body=bytes(self.buffer), **self.put_kwargs
+            )
+        else:
+            if self.buffer:
+                self._upload_part(bytes(self.buffer))
+            s3_client.complete_multipart_upload(
+                Bucket=BUCKET_NAME,
+                Key=self.s3_key,
+                UploadId=self.upload_id,
+                MultipartUpload={'Parts': self.parts}
+            )
+        self.upload_seconds += time.perf_counter() - started
+        self.buffer = bytearray()
+        self.closed = True
+
+    def abort(self):
+        """Discard buffered bytes and any parts already uploaded"""
+        self.buffer = bytearray()
+        self.closed = True
+        if self.upload_id is not None:
+            try:
+                s3_client.abort_multipart_upload(
+                    Bucket=BUCKET_NAME, Key=self.s3_key, UploadId=self.upload_id
+                )
+            except (ClientError, BotoCoreError) as e:
+                print(f"Error aborting multipart upload for {self.s3_key}: {e}")
+
+class CsvStatsWriter:
+    """Pass-through file object that counts CSV rows and tracks the WORKDATE range of the bytes written to it.
+
+    Only whole records are parsed: each write is cut after its last newline outside a
+    quoted field, and the rest waits for the next write. With pyarrow, only the
+    WORKDATE column is converted, in C++ and without holding the GIL; otherwise the
+    csv module parses the records.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.header = None
+        self.workdate_index = None
+        self.row_count = 0
+        self.workdate_min = None
+        self.workdate_max = None
+        self.pending = b''
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        buffer = self.pending + data if self.pending else bytes(data)
+        boundary = record_boundary(buffer)
+        if boundary:
+            self._track(buffer[:boundary])
+        self.pending = buffer[boundary:]
+        if self.sink is not None:
+            self.sink.write(data)
+        return len(data)
+
+    def _track(self, records):
+        if self.header is None:
+            header_end = records.index(b'\n') + 1
+            self.header = next(csv.reader([records[:header_end].decode('utf-8-sig', errors='replace')]))
+            columns = [column.strip().upper() for column in self.header]
+            self.workdate_index = columns.index('WORKDATE') if 'WORKDATE' in columns else None
+            records = records[header_end:]
+        if not records:
+            return
+        rows, workdate_range = (scan_workdates_arrow if pa is not None else scan_workdates_csv)(
+            records, len(self.header), self.workdate_index
+        )
+        self.row_count += rows
+        # Compare as strings: PBJ work dates are YYYYMMDD, which sorts chronologically
+        if workdate_range:
+            low, high = workdate_range
+            self.workdate_min = low if self.workdate_min is None else min(self.workdate_min, low)
+            self.workdate_max = high if self.workdate_max is None else max(self.workdate_max, high)
+
+    def finish(self):
+        """Count a last record that has no trailing newline"""
+        if self.pending:
+            self._track(self.pending + b'\n')
+            self.pending = b''
+
+    def stats(self):
+        return {
+            'row_count': self.row_count,
+            'workdate_min': format_workdate(self.workdate_min),
+            'workdate_max': format_workdate(self.workdate_max)
+        }
+
+def record_boundary(buffer):
+    """Offset just past the last newline in buffer that ends a CSV record (not inside quotes), or 0"""
+    quotes = buffer.count(b'"')
+    end = len(buffer)
+    position = buffer.rfind(b'\n')
+    while position != -1:
+        # Quotes before the newline: an odd count means it sits inside a quoted field
+        quotes -= buffer.count(b'"', position, end)
+        end = position
+        if quotes % 2 == 0:
+            return position + 1
+        position = buffer.rfind(b'\n', 0, position)
+    return 0
+
+def scan_workdates_arrow(records, column_count, workdate_index):
+    """Row count and (min, max) WORKDATE strings of whole CSV records, converting only that column"""
+    skipped = []
+    names = [f"c{index}" for index in range(column_count)]
+    table = pa_csv.read_csv(
+        pa.BufferReader(records),
+        read_options=pa_csv.ReadOptions(column_names=names),
+        # Snowflake still loads rows with a column count mismatch, so they are counted too
+        parse_options=pa_csv.ParseOptions(
+            newlines_in_values=True, invalid_row_handler=lambda row: skipped.append(row) or 'skip'
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=[names[workdate_index if workdate_index is not None else 0]],
+            column_types={name: pa.string() for name in names},
+            strings_can_be_null=True,
+            check_utf8=False
+        )
+    )
+    rows = table.num_rows + len(skipped)
+    if workdate_index is None or table.column(0).null_count == len(table):
+        return rows, None
+    low_high = pc.min_max(table.column(0))
+    return rows, (low_high['min'].as_py(), low_high['max'].as_py())
+
+def scan_workdates_csv(records, column_count, workdate_index):
+    """scan_workdates_arrow without pyarrow (the csv module holds the GIL throughout)"""
+    rows = 0
+    workdates = []
+    for row in csv.reader(io.StringIO(records.decode('utf-8', errors='replace'))):
+        rows += 1
+        if workdate_index is not None and len(row) > workdate_index and row[workdate_index]:
+            workdates.append(row[workdate_index])
+    return rows, (min(workdates), max(workdates)) if workdates else None
+
+def format_workdate(value):
+    """Render a PBJ YYYYMMDD work date as an ISO date"""
+    if value and len(value) == 8 and value.isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
+
+def stream_file_to_s3(file_id, filename, s3_key, metadata=None):
+    """Stream a Google Drive file into S3 chunk by chunk.
+
+    Returns the bytes downloaded and stored (which differ when GZIP_UPLOADS
+    compresses the stream) plus the CSV's row count and WORKDATE range, or
+    None if the transfer failed.
+    """
+    writer = S3MultipartWriter(s3_key, **upload_options(metadata or {}))
+    # GzipFile compresses each chunk as it is written, so only the part buffer is held
+    compressor = gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) if GZIP_UPLOADS else None
+    # Row counts and WORKDATE ranges are only needed for the load manifest
+    tracker = CsvStatsWriter(compressor or writer) if WRITE_MANIFESTS else None
+    started = time.perf_counter()
+    downloaded = 0
+
+    try:
+        with drive_service() as service:
+            request = service.files().get_media(fileId=file_id)
+            downloader = MediaIoBaseDownload(tracker or compressor or writer, request, chunksize=TRANSFER_CHUNK_SIZE)
+            done = False
+            while done is False:
+                status, done = call_with_retry(downloader.next_chunk, f"downloading {filename}")
+                downloaded = status.resumable_progress
+                print(f"Download {int(status.progress() * 100)}%")
+
+        if tracker is not None:
+            tracker.finish()
+        if compressor is not None:
+            compressor.close()  # writes the gzip trailer; leaves the writer open
+        writer.close()
+        print(f"Successfully streamed {filename} to s3://{BUCKET_NAME}/{s3_key}")
+        # S3 part uploads run inside the download loop; the rest of the time is Drive
+        total_ms = elapsed_ms(started)
+        upload_ms = round(writer.upload_seconds * 1000, 3)
+        emit_metrics('transfer', {
+            'DurationMs': (total_ms, 'Milliseconds'),
+            'DownloadMs': (round(total_ms - upload_ms, 3), 'Milliseconds'),
+            'UploadMs': (upload_ms, 'Milliseconds'),
+            'Bytes': (downloaded, 'Bytes'),
+            'BytesStored': (writer.bytes_written, 'Bytes')
+        }, File=filename)
+        return {'size': downloaded, 'stored_size': writer.bytes_written, **(tracker.stats() if tracker else {})}
+    except (HttpError, ClientError, *TRANSIENT_ERRORS) as error:
+        print(f"An error occurred streaming {filename}: {error}")
+        writer.abort()
+        return None
+    except Exception:
+        # Anything else fails the file in transfer_file; don't leave its parts billed in S3
+        writer.abort()
+        raise
+
+def read_csv_header(s3_key):
+    """Read the header row of a CSV object in S3 without downloading the whole file"""
+    response = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key, Range='bytes=0-65535')
+    head = response['Body'].read()
+    if s3_key.endswith('.gz'):
+        # Inflate just the fetched prefix of the gzip stream
+        head = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head)
+    first_line = head.decode('utf-8-sig', errors='replace').splitlines()[0]
+    return next(csv.reader([first_line]))
+
+def parquet_read_plan(filename, header):
+    """Column names and CSV read types for a file, plus the bronze types to cast each column to"""
+    if filename.startswith('PBJ_Daily_Nurse_Staffing') and len(header) == len(PBJ_BRONZE_COLUMNS):
+        names = [name for name, _ in PBJ_BRONZE_COLUMNS]
+        # Numbers are read as text and rounded exactly in cast_to_bronze_types, matching NUMBER(p,s) casts;
+        # a fixed read decimal type would fail the file on any value with more decimals than it holds
+        read_types = {name: pa.string() for name, _ in PBJ_BRONZE_COLUMNS}
+        target_types = {}
+        for name, sql_type in PBJ_BRONZE_COLUMNS:
+            if sql_type == 'NUMBER(10,2)':
+                target_types[name] = pa.decimal128(10, 2)
+            elif sql_type == 'NUMBER':
+                target_types[name] = pa.int64()
+            elif sql_type == 'DATE':
+                read_types[name] = pa.timestamp('s')
+                target_types[name] = pa.date32()
+            else:
+                target_types[name] = pa.string()
+        return names, read_types, target_types
+
+    # Other bronze tables are VARCHAR columns loaded as-is
+    return header, {name: pa.string() for name in header}, {name: pa.string() for name in header}
+
+def round_number_text(column, scale):
+    """Round decimal strings to `scale` digits, half away from zero as Snowflake does for NUMBER(p,s).
+
+    Returns the unscaled int64 values (value * 10**scale). Only the first dropped
+    digit matters for the rounding, so longer fractions are truncated first.
+    Works on integer kernels, since older pyarrow can't cast strings to decimal.
+    """
+    parts = pc.extract_regex(pc.utf8_trim_whitespace(column), NUMBER_TEXT_PATTERN)
+    invalid = pc.sum(pc.and_(parts.is_null(), column.is_valid())).as_py()
+    if invalid:
+        raise pa.ArrowInvalid(f"{invalid} values are not numbers")
+    integer = parts.field('integer')
+    integer = pc.cast(pc.if_else(pc.equal(integer, ''), '0', integer), pa.int64())
+    fraction = pc.fill_null(parts.field('fraction'), '')
+    fraction = pc.cast(pc.utf8_rpad(pc.utf8_slice_codeunits(fraction, 0, scale + 1), scale + 1, '0'), pa.int64())
+    magnitude = pc.add_checked(pc.multiply_checked(integer, 10 ** (scale + 1)), fraction)
+    unscaled = pc.divide(pc.add_checked(magnitude, 5), 10)
+    unscaled = pc.if_else(pc.equal(parts.field('sign'), '-'), pc.negate(unscaled), unscaled)
+    # Struct fields don't carry the struct's own nulls (empty fields)
+    return pc.if_else(parts.is_valid(), unscaled, pa.scalar(None, pa.int64()))
+
+def cast_to_bronze_types(batch, target_types):
+    """Cast a record batch read from CSV to its bronze column types"""
+    columns = []
+    for name in batch.schema.names:
+        column = batch.column(name)
+        target = target_types[name]
+        if pa.types.is_decimal(target) or pa.types.is_integer(target):
+            scale = target.scale if pa.types.is_decimal(target) else 0
+            column = round_number_text(column, scale)
+            if scale:
+                # int64 -> decimal, then shift the point; exact, and the final cast checks the precision
+                column = pc.multiply(pc.cast(column, pa.decimal128(19, 0)),
+                                     pa.scalar(Decimal(1).scaleb(-scale), pa.decimal128(scale + 1, scale)))
+        columns.append(pc.cast(column, target))
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+def convert_to_parquet(s3_key, filename):
+    """Convert an uploaded CSV to typed Parquet under PARQUET_PREFIX in bounded-memory blocks.
+
+    Returns per-file conversion stats, or None if the conversion failed (the error is logged).
+    """
+    parquet_key = PARQUET_PREFIX + os.path.splitext(filename)[0] + '.parquet'
+    started = time.monotonic()
+    writer = S3MultipartWriter(parquet_key, ContentType='application/vnd.apache.parquet')
+
+    try:
+        names, read_types, target_types = parquet_read_plan(filename, read_csv_header(s3_key))
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key)
+        bytes_in = response['ContentLength']
+        source = pa.PythonFile(response['Body'], mode='r')
+        if s3_key.endswith('.gz'):
+            source = pa.CompressedInputStream(source, 'gzip')
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(column_names=names, skip_rows=1, block_size=PARQUET_BLOCK_SIZE),
+            parse_options=pa_csv.ParseOptions(quote_char='"'),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=read_types,
+                timestamp_parsers=['%Y%m%d', pa_csv.ISO8601],
+                strings_can_be_null=True
+            )
+        )
+        schema = pa.schema([(name, target_types[name]) for name in names])
+        rows = 0
+        with pq.ParquetWriter(writer, schema, compression='snappy') as parquet_writer:
+            for batch in reader:
+                parquet_writer.write_batch(cast_to_bronze_types(batch, target_types))
+                rows += batch.num_rows
+        writer.close()
+    except Exception as e:
+        # Any failure here (bad values, an empty file, S3 errors) only skips the Parquet copy
+        print(f"Error converting {filename} to Parquet: {type(e).__name__}: {e}")
+        writer.abort()
+        return None
+
+    seconds = time.monotonic() - started
+    stats = {
+        'parquet_key': parquet_key,
+        'rows': rows,
+        'bytes_in': bytes_in,
+        'bytes_out': writer.bytes_written,
+        'seconds': round(seconds, 3),
+        'mb_per_second': round(bytes_in / (1024 * 1024) / seconds, 2) if seconds > 0 else None
+    }
+    emit_metrics('parquet', {
+        'DurationMs': (round(seconds * 1000, 3), 'Milliseconds'),
+        'Rows': (rows, 'Count'),
+        'BytesIn': (bytes_in, 'Bytes'),
+        'BytesOut': (writer.bytes_written, 'Bytes')
+    }, File=filename)
+    print(f"Converted {filename} to s3://{BUCKET_NAME}/{parquet_key}: {rows} rows, "
+          f"{bytes_in:,} -> {writer.bytes_written:,} bytes in {seconds:.1f}s ({stats['mb_per_second']} MB/s)")
+    return stats
+
+def transfer_file(file_info, state, current_time):
+    """Download one changed file from Google Drive and upload it to S3.
+
+    Returns None if the file failed; an unexpected error fails only this file,
+    so the run still saves state for the others.
+    """
+    try:
+        return transfer_one_file(file_info, state, current_time)
+    except Exception as error:
+        print(f"Unexpected error transferring {file_info.get('name')}: {type(error).__name__}: {error}")
+        return None
+
+def transfer_one_file(file_info, state, current_time):
+    file_id = file_info.get('id')
+    filename = file_info.get('name')
+
+    print(f"\n🔄 Processing: {filename}")
+    s3_key = s3_key_for(filename)
+    # Drive's checksum travels with the object so later runs can detect identical re-saves
+    metadata = {'drive-md5': file_info['md5Checksum']} if file_info.get('md5Checksum') else {}
+
+    if STREAM_UPLOADS:
+        # Drive chunks go straight into an S3 multipart upload
+        transferred = stream_file_to_s3(file_id, filename, s3_key, metadata)
+        if transferred is None:
+            return None
+    else:
+        with timed('download', File=filename) as metrics:
+            downloaded_data = download_file(file_id, filename)
+            metrics['Bytes'] = (len(downloaded_data or b''), 'Bytes')
+        if not downloaded_data:
+            return None
+        stats = {}
+        if WRITE_MANIFESTS:
+            tracker = CsvStatsWriter()
+            tracker.write(downloaded_data)
+            tracker.finish()
+            stats = tracker.stats()
+        size = len(downloaded_data)
+        if GZIP_UPLOADS:
+            downloaded_data = gzip.compress(downloaded_data, compresslevel=GZIP_LEVEL, mtime=0)
+        stored_size = len(downloaded_data)
+        with timed('upload', File=filename) as metrics:
+            uploaded = upload_to_s3(downloaded_data, filename, s3_key, metadata)
+            metrics['Bytes'] = (stored_size, 'Bytes')
+        if not uploaded:
+            return None
+        transferred = {'size': size, 'stored_size': stored_size, **stats}
+
+    result = {
+        'file_id': file_id,
+        'filename': filename,
+        's3_key': s3_key,
+        'md5_checksum': file_info.get('md5Checksum'),
+        **transferred
+    }
+    if CONVERT_TO_PARQUET and pa is not None:
+        # The CSV is already in S3 and is what Snowflake loads; a failed conversion is logged, not retried
+        result['parquet'] = convert_to_parquet(s3_key, filename)
+        if result['parquet'] is None:
+            print(f"Parquet stage failed for {filename}; the CSV upload is kept")
+
+    # Update state for successfully processed file
+    update_file_state(state, file_info, current_time)
+    return result
+
+def manifest_key_for(run_time):
+    """S3 key of the manifest for a run started at run_time (an ISO timestamp)"""
+    compact = datetime.fromisoformat(run_time.rstrip('Z')).strftime('%Y%m%dT%H%M%S%fZ')
+    return f"{MANIFEST_PREFIX}{compact}.json"
+
+def write_manifest(run_time, results):
+    """List the objects a run wrote so the Snowflake load can target just those files"""
+    manifest_key = manifest_key_for(run_time)
+    manifest = {
+        'run_time': run_time,
+        'bucket': BUCKET_NAME,
+        'files': [
+            {
+                'key': result['s3_key'],
+                'filename': result['filename'],
+                'size': result['stored_size'],
+                'source_size': result['size'],
+                'md5_checksum': result.get('md5_checksum'),
+                'row_count': result.get('row_count'),
+                'workdate_min': result.get('workdate_min'),
+                'workdate_max': result.get('workdate_max'),
+                **({'parquet_key': result['parquet']['parquet_key']} if result.get('parquet') else {})
+            }
+            for result in results
+        ]
+    }
+    try:
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=manifest_key,
+            Body=json.dumps(manifest, indent=2),
+            ContentType='application/json'
+        )
+        print(f"Wrote load manifest s3://{BUCKET_NAME}/{manifest_key} ({len(results)} files)")
+        return manifest_key
+    except ClientError as e:
+        print(f"Error writing load manifest {manifest_key}: {e}")
+        return None
+
+def has_time_left(context, reserve_seconds=0):
+    """Check if the Lambda has enough time left to start another transfer"""
+    if context is None:
+        return True
+    remaining_seconds = context.get_remaining_time_in_millis() / 1000
+    return remaining_seconds > TIME_BUDGET_MARGIN_SECONDS + reserve_seconds
+
+def transfer_files(changed_files, state, current_time, max_workers=MAX_TRANSFER_WORKERS, context=None):
+    """Transfer changed files with a bounded worker pool within the Lambda's time budget.
+
+    State is checkpointed every CHECKPOINT_INTERVAL_SECONDS. Returns the results
+    of the files that were started, in input order, and the files not started.
+    """
+    workers = max(max_workers, 1)
+    results = {}
+    in_flight = {}
+    next_index = 0
+    slowest_transfer = 0.0
+    last_checkpoint = time.monotonic()
+    dirty = False
+
+    # Each worker runs download -> upload for one file, so one file's download
+    # overlaps with another file's upload while at most `workers` are in flight
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transfer') as executor:
+        while True:
+            # Leave room for the slowest transfer seen so far to finish before the deadline
+            while (next_index < len(changed_files) and len(in_flight) < workers
+                   and has_time_left(context, slowest_transfer)):
+                future = executor.submit(transfer_file, changed_files[next_index], state, current_time)
+                in_flight[future] = (next_index, time.monotonic())
+                next_index += 1
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, started = in_flight.pop(future)
+                results[index] = future.result()
+                slowest_transfer = max(slowest_transfer, time.monotonic() - started)
+                dirty = dirty or results[index] is not None
+
+            if dirty and time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS:
+                print("Checkpointing pipeline state...")
+                save_state_file(state)
+                last_checkpoint = time.monotonic()
+                dirty = False
+
+    if next_index < len(changed_files):
+        print(f"Time budget reached - {len(changed_files) - next_index} files left for the next invocation")
+    return [results[index] for index in sorted(results)], changed_files[next_index:]
+
+def process_all_files(max_workers=MAX_TRANSFER_WORKERS, context=None):
+    """Download only changed CSV files from Google Drive with state management.
+
+    Returns a run summary. If the Lambda's time budget ran out, the summary
+    carries a continuation marker for a follow-up invocation.
+    """
     current_time = datetime.utcnow().isoformat() + 'Z'  # ISO format timestamp
+    run_started = time.perf_counter()
     
     try:
         print("=== PIPELINE START ===")
+        reset_retry_stats()
+        reset_metrics()
+        if CONVERT_TO_PARQUET and pa is None:
+            print("CONVERT_TO_PARQUET is set but pyarrow is not installed - skipping Parquet stage")
         
         # Step 1: Load existing state (ONE S3 call)
         print("Loading pipeline state...")
-        state = load_state_file()
+        with timed('load_state'):
+            state = load_state_file()
         print(f"Previous run: {state.get('last_pipeline_run', 'Never')}")
         
-        # Step 2: Get all files from Google Drive
-        print("Searching for files in Google Drive...")
-        file_list = search_file()
-        
-        if not file_list:
-            print("No files found!")
-            return []
-        
-        print(f"Found {len(file_list)} total files in Google Drive")
+        # Step 2: Get changed files from the Drive change feed, or all files from a full folder scan
+        file_list = None
+        previous_page_token = state.get('drive_changes_page_token')
+        next_page_token = None
+        # Toggling GZIP_UPLOADS moves every object to a new key, which the change feed alone wouldn't list
+        keys_changed = state.get('gzip_uploads', False) != GZIP_UPLOADS
+        if keys_changed:
+            print("GZIP_UPLOADS changed since the last run - rescanning the folder to re-upload under the new keys")
+        if USE_DRIVE_CHANGES and previous_page_token and not keys_changed:
+            print("Listing changes in Google Drive since last run...")
+            with timed('list_changes') as metrics:
+                file_list, next_page_token = search_changes(previous_page_token)
+                metrics['Files'] = (len(file_list or []), 'Count')
+            if file_list is None:
+                print("Change token rejected - falling back to full folder scan")
+            else:
+                print(f"Found {len(file_list)} changed files in Google Drive")
         
-        # Step 3: Process only changed files
-        successful_downloads = []
-        failed_count = 0
-        skipped_count = 0
+        if file_list is None:
+            if USE_DRIVE_CHANGES:
+                # Take the token before scanning so changes made during the scan are picked up next run
+                next_page_token = get_start_page_token()
+            print("Searching for files in Google Drive...")
+            with timed('list_files') as metrics:
+                file_list = search_file()
+                metrics['Files'] = (len(file_list or []), 'Count')
+            
+            if not file_list:
+                print("No files found!")
+                return {'processed': [], 'continuation': None}
+            
+            print(f"Found {len(file_list)} total files in Google Drive")
         
+        # Step 3: Process only changed files whose content actually differs
+        state['files'].preload(file_info.get('name') for file_info in file_list)
+        changed_files = []
+        identical_count = 0
+        identical_bytes = 0
         for file_info in file_list:
-            file_id = file_info.get('id')
-            filename = file_info.get('name')
-            
-            # Check if file needs processing using state
-            if should_process_file(file_info, state):
-                print(f"\n🔄 Processing: {filename}")
-                downloaded_data = download_file(file_id, filename)
-                
-                if downloaded_data:
-                    s3_key = f"data/{filename}"
-                    if upload_to_s3(downloaded_data, filename, s3_key):
-                        successful_downloads.append({
-                            'file_id': file_id,
-                            'filename': filename,
-                            'data': downloaded_data
-                        })
-                        # Update state for successfully processed file
-                        update_file_state(state, file_info, current_time)
-                    else:
-                        failed_count += 1
-                else:
-                    failed_count += 1
+            if not should_process_file(file_info, state):
+                continue
+            if is_content_unchanged(file_info, state):
+                # Record the new modifiedTime so the file isn't re-checked next run
+                update_file_state(state, file_info, current_time)
+                identical_count += 1
+                identical_bytes += int(file_info.get('size') or 0)
             else:
-                skipped_count += 1
+                changed_files.append(file_info)
+        skipped_count = len(file_list) - len(changed_files) - identical_count
+        
+        print(f"Transferring {len(changed_files)} changed files with up to {max(max_workers, 1)} workers")
+        results, remaining_files = transfer_files(changed_files, state, current_time, max_workers, context)
+        successful_downloads = [result for result in results if result]
+        failed_count = len(results) - len(successful_downloads)
         
         # Step 4: Update pipeline run timestamp and save state (ONE S3 call)
         state['last_pipeline_run'] = current_time
+        if failed_count == 0 and not remaining_files and next_page_token:
+            # Keep the old token on failures or early stops so the next run sees those files again
+            state['drive_changes_page_token'] = next_page_token
+            state['drive_changes_token_updated'] = current_time
+        if failed_count == 0 and not remaining_files:
+            state['gzip_uploads'] = GZIP_UPLOADS
         save_state_file(state)
         
+        manifest_key = None
+        if WRITE_MANIFESTS and successful_downloads:
+            manifest_key = write_manifest(current_time, successful_downloads)
+        
+        # Files already in state are skipped on resume, so no transfer is repeated
+        continuation = None
+        if remaining_files:
+            continuation = {
+                'remaining_files': len(remaining_files),
+                'processed_this_invocation': len(successful_downloads),
+                'stopped_at': datetime.utcnow().isoformat() + 'Z'
+            }
+        
         print(f"\n=== PIPELINE SUMMARY ===")
         print(f"Processed: {len(successful_downloads)} files")
         print(f"Skipped (unchanged): {skipped_count} files") 
+        print(f"Skipped (identical content): {identical_count} files, {identical_bytes / (1024 * 1024):.1f} MB not transferred")
         print(f"Failed: {failed_count} files")
-        print(f"Efficiency: {skipped_count}/{len(file_list)} files skipped")
+        print(f"Efficiency: {skipped_count + identical_count}/{len(file_list)} files skipped")
+        bytes_transferred = sum(result['size'] for result in successful_downloads)
+        bytes_stored = sum(result['stored_size'] for result in successful_downloads)
+        compression_ratio = round(bytes_transferred / bytes_stored, 2) if bytes_stored else None
+        if GZIP_UPLOADS:
+            print(f"Compression: {bytes_transferred / (1024 * 1024):.1f} MB -> {bytes_stored / (1024 * 1024):.1f} MB "
+                  f"(ratio {compression_ratio})")
+        print(f"Drive retries: {retry_stats['retries']} ({retry_stats['throttled_responses']} throttled), "
+              f"{retry_stats['throttle_seconds']:.1f}s spent backing off throttled requests")
+        if continuation:
+            print(f"Remaining (continue in next invocation): {len(remaining_files)} files")
         
-        return successful_downloads
+        emit_metrics('run', {
+            'DurationMs': (elapsed_ms(run_started), 'Milliseconds'),
+            'FilesListed': (len(file_list), 'Count'),
+            'FilesProcessed': (len(successful_downloads), 'Count'),
+            'FilesSkipped': (skipped_count + identical_count, 'Count'),
+            'FilesFailed': (failed_count, 'Count'),
+            'BytesTransferred': (bytes_transferred, 'Bytes'),
+            'BytesStored': (bytes_stored, 'Bytes'),
+            'BytesSkipped': (identical_bytes, 'Bytes'),
+            'DriveRetries': (retry_stats['retries'], 'Count'),
+            'ThrottleMs': (round(retry_stats['throttle_seconds'] * 1000, 3), 'Milliseconds')
+        })
+        
+        return {
+            'processed': successful_downloads,
+            'skipped': skipped_count,
+            'identical': identical_count,
+            'identical_bytes': identical_bytes,
+            'failed': failed_count,
+            'bytes_transferred': bytes_transferred,
+            'bytes_stored': bytes_stored,
+            'compression_ratio': compression_ratio,
+            'retries': dict(retry_stats),
+            'manifest_key': manifest_key,
+            'continuation': continuation
+        }
         
     except Exception as e:
         print(f"Error in process_all_files: {e}")
-        return []
+        return {'processed': [], 'continuation': None}
+
+def continue_in_new_invocation(event, context, continuation):
+    """Asynchronously invoke this function again to resume a run that hit the time budget"""
+    chain_depth = int((event or {}).get('continuation', {}).get('chain_depth', 0)) + 1
+    if chain_depth > MAX_CHAINED_INVOCATIONS:
+        print(f"Reached {MAX_CHAINED_INVOCATIONS} chained invocations - leaving the rest for the next scheduled run")
+        return False
+    if continuation['processed_this_invocation'] == 0:
+        # No progress means a single transfer no longer fits in one invocation
+        print("No files finished in this invocation - not chaining another")
+        return False
+
+    payload = dict(event or {})
+    payload['continuation'] = dict(continuation, chain_depth=chain_depth)
+    lambda_client.invoke(
+        FunctionName=context.function_name,
+        InvocationType='Event',
+        Payload=json.dumps(payload)
+    )
+    print(f"Started continuation invocation {chain_depth}")
+    return True
 
 def lambda_handler(event, context):
     """Main Lambda handler with state management"""
     try:
-        # Process files with incremental logic
-        result = process_all_files()
+        # Process files with incremental logic; event may override the worker count
+        max_workers = int((event or {}).get('max_workers', MAX_TRANSFER_WORKERS))
+        if (event or {}).get('continuation'):
+            print(f"Resuming previous run: {event['continuation']}")
+        summary = process_all_files(max_workers=max_workers, context=context)
+        result = summary['processed']
+        continuation = summary['continuation']
+        
+        if continuation and AUTO_CONTINUE and context is not None:
+            continue_in_new_invocation(event, context, continuation)
         
-        if not result:
+        if not result and not continuation:
             return {
                 'statusCode': 200,
                 'body': 'No files needed processing (all up to date)'
@@ -229,7 +1388,9 @@ def lambda_handler(event, context):
         
         return {
             'statusCode': 200,
-            'body': f'Successfully processed {len(result)} changed files'
+            'body': f'Successfully processed {len(result)} changed files',
+            'manifest_key': summary.get('manifest_key'),
+            'continuation': continuation
         }
         
     except Exception as e:
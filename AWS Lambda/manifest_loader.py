@@ -0,0 +1,131 @@
+"""Turn a run manifest written by lambda_function into targeted Snowflake COPY INTO statements.
+
+Each statement names the run's files explicitly (COPY INTO ... FILES = (...)), so Snowflake
+reads only the objects that run wrote instead of listing the whole S3_HEALTHCARE_STAGE prefix.
+
+Usage:
+    python manifest_loader.py                                   # latest manifest
+    python manifest_loader.py manifests/20250101T070000000000Z.json
+
+As a Lambda handler, pass {"manifest_key": "..."}; without it the latest manifest is used.
+"""
+import json
+import re
+import sys
+
+import boto3
+
+s3_client = boto3.client('s3')
+
+BUCKET_NAME = "healthcare-data-lake-dea-2025"
+MANIFEST_PREFIX = "manifests/"
+BRONZE_SCHEMA = "HEALTHCARE_ANALYTICS.BRONZE"
+# The stage URL is s3://healthcare-data-lake-dea-2025/data/, so FILES are relative to data/
+STAGE_NAME = f"{BRONZE_SCHEMA}.S3_HEALTHCARE_STAGE"
+STAGE_PREFIX = "data/"
+FILE_FORMAT = f"{BRONZE_SCHEMA}.CSV_FORMAT_NO_ERROR"
+# Snowflake accepts at most 1000 file names per COPY statement
+MAX_FILES_PER_COPY = 1000
+TABLE_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Column lists and SELECT expressions of the bronze loads in snowflake/healthcare-setup.sql
+COL_LIST = ' (' + ', '.join(f"COL{i}" for i in range(1, 11)) + ')'
+COL_SELECT = ', '.join(f"t.${i}" for i in range(1, 11))
+# The PBJ files have 33 columns; naming them leaves LOAD_TIMESTAMP to its CURRENT_TIMESTAMP() default,
+# which the incremental dbt silver models use as their watermark
+PBJ_COLUMNS = (
+    'PROVNUM', 'PROVNAME', 'CITY', 'STATE', 'COUNTY_NAME', 'COUNTY_FIPS', 'CY_Qtr', 'WORKDATE', 'MDSCENSUS',
+    'HRS_RNDON', 'HRS_RNDON_tmp', 'HRS_RNDON_ctr', 'HRS_RNADMIN', 'HRS_RNADMIN_emp', 'HRS_RNADMIN_ctr',
+    'HRS_RN', 'HRS_RN_emp', 'HRS_RN_ctr', 'HRS_LPNADMIN', 'HRS_LPNADMIN_emp', 'HRS_LPNADMIN_ctr',
+    'HRS_LPN', 'HRS_LPN_emp', 'HRS_LPN_ctr', 'HRS_CNA', 'HRS_CNA_emp', 'HRS_CNA_ctr',
+    'HRS_NATRN', 'HRS_NATRN_emp', 'HRS_NATRN_ctr', 'HRS_MEDAIDE', 'HRS_MEDAIDE_emp', 'HRS_MEDAIDE_ctr',
+)
+PBJ_COL_LIST = ' (' + ', '.join(PBJ_COLUMNS) + ')'
+PBJ_SELECT = ', '.join(f"t.${i}" for i in range(1, len(PBJ_COLUMNS) + 1))
+VBP_AGGREGATE_SELECT = (
+    "TRY_CAST(t.$1 AS NUMBER(10,5)), TRY_CAST(t.$2 AS NUMBER(10,5)), "
+    "TRY_CAST(t.$3 AS NUMBER(10,5)), TRY_CAST(t.$4 AS NUMBER(10,5)), "
+    "t.$5, TRY_CAST(t.$6 AS NUMBER(10,0)), TRY_CAST(t.$7 AS NUMBER(15,10)), "
+    "t.$8, t.$9, t.$10"
+)
+
+def table_for(filename):
+    """Bronze table a CSV loads into: its file name without .csv / .csv.gz"""
+    return re.sub(r'\.csv(\.gz)?$', '', filename, flags=re.IGNORECASE)
+
+def load_columns(table):
+    """Column list and SELECT expressions used to load a bronze table"""
+    if table.startswith('PBJ_Daily_Nurse_Staffing'):
+        return PBJ_COL_LIST, PBJ_SELECT
+    if table == 'FY_2024_SNF_VBP_Aggregate_Performance':
+        return COL_LIST, VBP_AGGREGATE_SELECT
+    return COL_LIST, COL_SELECT
+
+def quote_literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+def build_copy_statements(manifest):
+    """Build one COPY INTO per target table covering just the manifest's files"""
+    files_by_table = {}
+    for entry in manifest.get('files', []):
+        key = entry['key']
+        table = table_for(entry.get('filename') or key.rsplit('/', 1)[-1])
+        if not key.startswith(STAGE_PREFIX) or not TABLE_NAME_PATTERN.match(table):
+            print(f"Skipping {key}: not a stage file with a valid table name")
+            continue
+        files_by_table.setdefault(table, []).append(entry)
+
+    statements = []
+    for table, entries in sorted(files_by_table.items()):
+        column_list, select = load_columns(table)
+        for start in range(0, len(entries), MAX_FILES_PER_COPY):
+            batch = entries[start:start + MAX_FILES_PER_COPY]
+            rows = sum(entry.get('row_count') or 0 for entry in batch)
+            files = ', '.join(quote_literal(entry['key'][len(STAGE_PREFIX):]) for entry in batch)
+            statements.append(
+                f"-- {len(batch)} files, {rows} rows expected\n"
+                f"COPY INTO {BRONZE_SCHEMA}.{table}{column_list}\n"
+                f"FROM (\n"
+                f"    SELECT {select}\n"
+                f"    FROM @{STAGE_NAME} t\n"
+                f")\n"
+                f"FILES = ({files})\n"
+                f"FILE_FORMAT = (FORMAT_NAME = '{FILE_FORMAT}')\n"
+                f"ON_ERROR = 'CONTINUE';"
+            )
+    return statements
+
+def latest_manifest_key():
+    """Most recent manifest key; keys sort by run timestamp"""
+    latest = None
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=MANIFEST_PREFIX):
+        for item in page.get('Contents', []):
+            if latest is None or item['Key'] > latest:
+                latest = item['Key']
+    return latest
+
+def load_manifest(manifest_key):
+    response = s3_client.get_object(Bucket=BUCKET_NAME, Key=manifest_key)
+    return json.loads(response['Body'].read())
+
+def lambda_handler(event, context):
+    """Return the COPY INTO statements for one run's manifest"""
+    manifest_key = (event or {}).get('manifest_key') or latest_manifest_key()
+    if not manifest_key:
+        return {'statusCode': 404, 'body': 'No load manifests found'}
+    manifest = load_manifest(manifest_key)
+    statements = build_copy_statements(manifest)
+    print(f"Built {len(statements)} COPY statements for {len(manifest.get('files', []))} files in {manifest_key}")
+    return {'statusCode': 200, 'manifest_key': manifest_key, 'statements': statements}
+
+def main():
+    manifest_key = sys.argv[1] if len(sys.argv) > 1 else latest_manifest_key()
+    if not manifest_key:
+        sys.exit("No load manifests found")
+    print(f"-- Manifest: s3://{BUCKET_NAME}/{manifest_key}")
+    for statement in build_copy_statements(load_manifest(manifest_key)):
+        print(statement + "\n")
+
+if __name__ == '__main__':
+    main()
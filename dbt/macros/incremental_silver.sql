@@ -0,0 +1,34 @@
+{#- Incremental silver models process only the rows loaded since the previous run. LOAD_TIMESTAMP
+    is the time each bronze row was loaded and is carried through silver as loaded_at. The
+    lookback also re-reads loads that committed after the last run had started, as their
+    timestamp is earlier than the watermark. Rows for old work dates that arrive in a later
+    file get a new loaded_at, so they are picked up whatever their work_date. -#}
+
+{% macro incremental_batch_filter(loaded_at_column='loaded_at') -%}
+    {%- if is_incremental() -%}
+        {{ loaded_at_column }} > (
+            SELECT COALESCE(
+                DATEADD(hour, -{{ var('late_arrival_lookback_hours') }}, MAX(loaded_at)),
+                '1900-01-01'::TIMESTAMP
+            )
+            FROM {{ this }}
+        )
+    {%- else -%}
+        TRUE
+    {%- endif -%}
+{%- endmacro %}
+
+{#- Pre-hook for silver models that filter rows of silver_nursing_staffing_cleaned. A MERGE
+    cannot remove a facility-day whose newest load no longer passes the model's filter, so the
+    row is deleted before the merge. A full refresh would leave it out in the same way. -#}
+
+{% macro delete_filtered_out_rows(keep_condition) -%}
+    {%- if is_incremental() -%}
+        DELETE FROM {{ this }} AS target
+        USING {{ ref('silver_nursing_staffing_cleaned') }} AS cleaned
+        WHERE target.facility_id = cleaned.facility_id
+          AND target.work_date = cleaned.work_date
+          AND {{ incremental_batch_filter('cleaned.loaded_at') }}
+          AND NOT ({{ keep_condition }})
+    {%- endif -%}
+{%- endmacro %}
@@ -1,5 +1,8 @@
 {{ config(
-    materialized='table',
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['facility_id', 'work_date'],
+    cluster_by=['work_date', 'state'],
     database='HEALTHCARE_ANALYTICS',
     schema='silver',
     alias='silver_employment_analysis'
@@ -12,5 +15,7 @@ SELECT
     work_date,
     (rn_emp_hours + lpn_emp_hours + cna_emp_hours) as total_employee_hours,
     (rn_contract_hours + lpn_contract_hours + cna_contract_hours) as total_contract_hours,
-    ROUND((rn_contract_hours + lpn_contract_hours + cna_contract_hours)/ NULLIF((rn_emp_hours + lpn_emp_hours + cna_emp_hours), 0) * 100, 1) as contract_percentage
+    ROUND((rn_contract_hours + lpn_contract_hours + cna_contract_hours)/ NULLIF((rn_emp_hours + lpn_emp_hours + cna_emp_hours), 0) * 100, 1) as contract_percentage,
+    loaded_at
 FROM {{ ref('silver_nursing_staffing_cleaned') }}
+WHERE {{ incremental_batch_filter() }}
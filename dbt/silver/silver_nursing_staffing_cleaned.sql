@@ -1,5 +1,8 @@
 {{ config(
-    materialized='table',
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['facility_id', 'work_date'],
+    cluster_by=['work_date', 'state'],
     database='HEALTHCARE_ANALYTICS',
     schema='silver',
     alias='silver_nursing_staffing_cleaned'
@@ -19,6 +22,15 @@ SELECT
     COALESCE(HRS_LPN_emp, 0) as lpn_emp_hours,
     COALESCE(HRS_LPN_ctr, 0) as lpn_contract_hours,
     COALESCE(HRS_CNA_emp, 0) as cna_emp_hours,
-    COALESCE(HRS_CNA_ctr, 0) as cna_contract_hours
+    COALESCE(HRS_CNA_ctr, 0) as cna_contract_hours,
+    LOAD_TIMESTAMP as loaded_at
 FROM {{ source('bronze', 'PBJ_Daily_Nurse_Staffing_Q2_2024') }}
 WHERE PROVNUM IS NOT NULL
+  -- Rows without a date have no key to merge on
+  AND TRY_CAST(WORKDATE AS DATE) IS NOT NULL
+  AND {{ incremental_batch_filter('LOAD_TIMESTAMP') }}
+-- Bronze keeps every load, so a re-delivered file repeats its facility-days; keep the latest load
+QUALIFY ROW_NUMBER() OVER (
+    PARTITION BY PROVNUM, TRY_CAST(WORKDATE AS DATE)
+    ORDER BY LOAD_TIMESTAMP DESC NULLS LAST
+) = 1
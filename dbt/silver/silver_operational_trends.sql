@@ -1,5 +1,9 @@
 {{ config(
-    materialized='table',
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['facility_id', 'work_date'],
+    cluster_by=['work_date', 'state'],
+    pre_hook="{{ delete_filtered_out_rows('cleaned.patient_census > 0') }}",
     database='HEALTHCARE_ANALYTICS',
     schema='silver',
     alias='silver_operational_trends'
@@ -14,6 +18,8 @@ SELECT
     EXTRACT(DOW FROM work_date) as day_of_week,
     patient_census,
     (rn_hours + lpn_hours + cna_hours) as total_nursing_hours,
-    ROUND((rn_hours + lpn_hours + cna_hours) / NULLIF(patient_census, 0), 2) as efficiency_ratio
+    ROUND((rn_hours + lpn_hours + cna_hours) / NULLIF(patient_census, 0), 2) as efficiency_ratio,
+    loaded_at
 FROM {{ ref('silver_nursing_staffing_cleaned') }}
 WHERE patient_census > 0
+  AND {{ incremental_batch_filter() }}
@@ -1,5 +1,9 @@
 {{ config(
-    materialized='table',
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['facility_id', 'work_date'],
+    cluster_by=['work_date', 'state'],
+    pre_hook="{{ delete_filtered_out_rows('cleaned.patient_census > 0') }}",
     database='HEALTHCARE_ANALYTICS',
     schema='silver',
     alias='silver_staffing_efficiency'
@@ -13,6 +17,8 @@ SELECT
     ROUND(rn_hours / NULLIF(patient_census, 0), 2) as rn_hours_per_patient,
     ROUND(lpn_hours / NULLIF(patient_census, 0), 2) as lpn_hours_per_patient,
     ROUND(cna_hours / NULLIF(patient_census, 0), 2) as cna_hours_per_patient,
-    ROUND((rn_hours + lpn_hours + cna_hours) / NULLIF(patient_census, 0), 2) as total_nursing_hours_per_patient
+    ROUND((rn_hours + lpn_hours + cna_hours) / NULLIF(patient_census, 0), 2) as total_nursing_hours_per_patient,
+    loaded_at
 FROM {{ ref('silver_nursing_staffing_cleaned') }}
 WHERE patient_census > 0
+  AND {{ incremental_batch_filter() }}
@@ -1,5 +1,9 @@
 {{ config(
-    materialized='table',
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['facility_id', 'work_date'],
+    cluster_by=['work_date', 'state'],
+    pre_hook="{{ delete_filtered_out_rows('(cleaned.rn_hours + cleaned.lpn_hours + cleaned.cna_hours) > 0') }}",
     database='HEALTHCARE_ANALYTICS',
     schema='silver',
     alias='silver_workload_distribution'
@@ -16,6 +20,8 @@ SELECT
     (rn_hours + lpn_hours + cna_hours) as total_nursing_hours,
     ROUND(rn_hours / NULLIF((rn_hours + lpn_hours + cna_hours), 0) * 100, 1) as rn_percentage,
     ROUND(lpn_hours / NULLIF((rn_hours + lpn_hours + cna_hours), 0) * 100, 1) as lpn_percentage,
-    ROUND(cna_hours / NULLIF((rn_hours + lpn_hours + cna_hours), 0) * 100, 1) as cna_percentage
+    ROUND(cna_hours / NULLIF((rn_hours + lpn_hours + cna_hours), 0) * 100, 1) as cna_percentage,
+    loaded_at
 FROM {{ ref('silver_nursing_staffing_cleaned') }}
 WHERE (rn_hours + lpn_hours + cna_hours) > 0
+  AND {{ incremental_batch_filter() }}
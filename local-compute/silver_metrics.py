@@ -0,0 +1,470 @@
+"""Compute the dbt silver models locally from the PBJ CSVs the Lambda stages.
+
+Reproduces the five silver models in dbt/silver with exact decimal arithmetic:
+- bronze load semantics (NUMBER(p,s) rounding, ON_ERROR = 'CONTINUE' row rejection)
+- COALESCE, NULLIF and ROUND
+- Snowflake's intermediate division scale
+- the latest-load-wins dedupe on (facility_id, work_date)
+
+Files are read in Arrow CSV blocks and processed in parallel, one process per
+file. The results are written as one Parquet file per model.
+
+Usage:
+    python silver_metrics.py data/PBJ_Daily_Nurse_Staffing_*.csv --output silver/ --workers 8
+    python silver_metrics.py data/*.csv.gz --output silver/ --compare warehouse_exports/
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Columns of BRONZE.PBJ_Daily_Nurse_Staffing_Q2_2024 (snowflake/healthcare-setup.sql), in file order
+PBJ_BRONZE_COLUMNS = [
+    ('PROVNUM', 'VARCHAR(10)'), ('PROVNAME', 'VARCHAR(100)'), ('CITY', 'VARCHAR(50)'), ('STATE', 'VARCHAR(2)'),
+    ('COUNTY_NAME', 'VARCHAR(50)'), ('COUNTY_FIPS', 'NUMBER(10,2)'), ('CY_Qtr', 'VARCHAR(8)'),
+    ('WORKDATE', 'DATE'), ('MDSCENSUS', 'NUMBER(38,0)'),
+    ('HRS_RNDON', 'NUMBER(10,2)'), ('HRS_RNDON_tmp', 'NUMBER(10,2)'), ('HRS_RNDON_ctr', 'NUMBER(10,2)'),
+    ('HRS_RNADMIN', 'NUMBER(10,2)'), ('HRS_RNADMIN_emp', 'NUMBER(10,2)'), ('HRS_RNADMIN_ctr', 'NUMBER(10,2)'),
+    ('HRS_RN', 'NUMBER(10,2)'), ('HRS_RN_emp', 'NUMBER(10,2)'), ('HRS_RN_ctr', 'NUMBER(10,2)'),
+    ('HRS_LPNADMIN', 'NUMBER(10,2)'), ('HRS_LPNADMIN_emp', 'NUMBER(10,2)'), ('HRS_LPNADMIN_ctr', 'NUMBER(10,2)'),
+    ('HRS_LPN', 'NUMBER(10,2)'), ('HRS_LPN_emp', 'NUMBER(10,2)'), ('HRS_LPN_ctr', 'NUMBER(10,2)'),
+    ('HRS_CNA', 'NUMBER(10,2)'), ('HRS_CNA_emp', 'NUMBER(10,2)'), ('HRS_CNA_ctr', 'NUMBER(10,2)'),
+    ('HRS_NATRN', 'NUMBER(10,2)'), ('HRS_NATRN_emp', 'NUMBER(10,2)'), ('HRS_NATRN_ctr', 'NUMBER(10,2)'),
+    ('HRS_MEDAIDE', 'NUMBER(10,2)'), ('HRS_MEDAIDE_emp', 'NUMBER(10,2)'), ('HRS_MEDAIDE_ctr', 'NUMBER(10,2)'),
+]
+# Bronze numbers the silver models read; the other NUMBER columns are only checked for loadability
+SILVER_SOURCE_COLUMNS = (
+    'MDSCENSUS', 'HRS_RN', 'HRS_RN_emp', 'HRS_RN_ctr', 'HRS_LPN', 'HRS_LPN_emp', 'HRS_LPN_ctr',
+    'HRS_CNA', 'HRS_CNA_emp', 'HRS_CNA_ctr'
+)
+# CSV_FORMAT_NO_ERROR: empty fields and \N load as NULL, except that "" in a VARCHAR column stays an empty string
+NULL_VALUES = ['', '\\N']
+# Work dates are YYYYMMDD in the PBJ files; ISO dates are accepted too, as in the Lambda's Parquet stage
+DATE_FORMATS = ['%Y%m%d', '%Y-%m-%d']
+NUMBER_PATTERN = r'^(?P<sign>[+-]?)(?P<integer>\d*)(?:\.(?P<fraction>\d*))?$'
+# Snowflake gives a quotient the scale max(s1, min(s1 + 6, 12)) and rounds it to that scale
+DIVISION_EXTRA_SCALE = 6
+DIVISION_MAX_SCALE = 12
+BLOCK_SIZE_MB = int(os.environ.get('SILVER_BLOCK_SIZE_MB', '16'))
+
+# Output columns of each dbt silver model, in model order
+SILVER_MODELS = {
+    'silver_nursing_staffing_cleaned': (
+        'facility_id', 'facility_name', 'state', 'work_date', 'rn_hours', 'patient_census', 'lpn_hours',
+        'cna_hours', 'rn_emp_hours', 'rn_contract_hours', 'lpn_emp_hours', 'lpn_contract_hours',
+        'cna_emp_hours', 'cna_contract_hours'
+    ),
+    'silver_staffing_efficiency': (
+        'facility_id', 'facility_name', 'state', 'work_date', 'rn_hours_per_patient', 'lpn_hours_per_patient',
+        'cna_hours_per_patient', 'total_nursing_hours_per_patient'
+    ),
+    'silver_workload_distribution': (
+        'facility_id', 'facility_name', 'state', 'work_date', 'rn_hours', 'lpn_hours', 'cna_hours',
+        'total_nursing_hours', 'rn_percentage', 'lpn_percentage', 'cna_percentage'
+    ),
+    'silver_employment_analysis': (
+        'facility_id', 'facility_name', 'state', 'work_date', 'total_employee_hours', 'total_contract_hours',
+        'contract_percentage'
+    ),
+    'silver_operational_trends': (
+        'facility_id', 'facility_name', 'state', 'work_date', 'month', 'day_of_week', 'patient_census',
+        'total_nursing_hours', 'efficiency_ratio'
+    ),
+}
+
+
+class Number:
+    """A NUMBER(38,s) column held as unscaled integers (value = unscaled / 10**scale) plus a null mask"""
+
+    def __init__(self, unscaled, scale, null):
+        self.unscaled = unscaled
+        self.scale = scale
+        self.null = null
+
+    def __add__(self, other):
+        scale = max(self.scale, other.scale)
+        return Number(
+            rescale_up(self.unscaled, scale - self.scale) + rescale_up(other.unscaled, scale - other.scale),
+            scale, self.null | other.null
+        )
+
+    def __mul__(self, factor):
+        """Multiply by an integer literal (NUMBER(n,0)), which keeps the scale"""
+        return Number(widen(self.unscaled, factor) * factor, self.scale, self.null)
+
+    def __truediv__(self, other):
+        scale = max(self.scale, min(self.scale + DIVISION_EXTRA_SCALE, DIVISION_MAX_SCALE))
+        null = self.null | other.null | (other.unscaled == 0)
+        denominator = np.where(null, 1, other.unscaled)
+        numerator = rescale_up(self.unscaled, scale - self.scale + other.scale)
+        return Number(np.where(null, 0, divide_half_away(numerator, denominator)), scale, null)
+
+    def coalesce(self, default=0):
+        return Number(np.where(self.null, default * 10 ** self.scale, self.unscaled), self.scale,
+                      np.zeros(len(self.null), dtype=bool))
+
+    def round(self, scale):
+        """ROUND(x, scale): half away from zero"""
+        if scale >= self.scale:
+            return self
+        return Number(divide_half_away(self.unscaled, 10 ** (self.scale - scale)), scale, self.null)
+
+    def greater_than_zero(self):
+        return ~self.null & (self.unscaled > 0)
+
+    def to_arrow(self):
+        """decimal128(38, scale) array built from the unscaled integers"""
+        if self.unscaled.dtype == object:
+            return pa.array(
+                [None if null else Decimal(int(value)).scaleb(-self.scale)
+                 for value, null in zip(self.unscaled.tolist(), self.null.tolist())],
+                type=pa.decimal128(38, self.scale)
+            )
+        values = unscaled_to_decimal(self.unscaled, self.scale)
+        if not self.null.any():
+            return values
+        return pc.if_else(pa.array(self.null), pa.scalar(None, values.type), values)
+
+
+def widen(values, factor):
+    """Switch to exact Python integers where int64 could overflow (never for PBJ-sized values)"""
+    if values.dtype != object and len(values) and int(np.abs(values).max()) * abs(factor) * 2 >= 2 ** 63:
+        return values.astype(object)
+    return values
+
+
+def rescale_up(values, digits):
+    factor = 10 ** digits
+    return widen(values, factor) * factor if digits else values
+
+
+def divide_half_away(numerator, denominator):
+    """Integer division rounded half away from zero"""
+    numerator = widen(numerator, 2)
+    sign = np.where((numerator < 0) != (np.asarray(denominator) < 0), -1, 1)
+    magnitude = (2 * np.abs(numerator) + np.abs(denominator)) // (2 * np.abs(denominator))
+    return sign * magnitude
+
+
+def unscaled_to_decimal(unscaled, scale):
+    """Build a decimal128 array straight from int64 unscaled values (two's complement, little-endian)"""
+    unscaled = unscaled.astype('<i8')
+    words = np.empty(len(unscaled) * 2, dtype='<i8')
+    words[0::2] = unscaled
+    words[1::2] = np.where(unscaled < 0, -1, 0)
+    return pa.Array.from_buffers(pa.decimal128(38, scale), len(unscaled), [None, pa.py_buffer(words.tobytes())])
+
+
+def empty_as_null(column):
+    return pc.if_else(pc.equal(column, ''), pa.scalar(None, pa.string()), column)
+
+
+def parse_number(column, precision, scale):
+    """Load a CSV string column into NUMBER(precision, scale) as COPY INTO does.
+
+    Returns the Number and a mask of rows the load rejects (not a number, or too many digits).
+    Extra decimals are rounded half away from zero, which only needs the first dropped digit.
+    """
+    column = empty_as_null(column)
+    null = column.is_null().to_numpy(zero_copy_only=False)
+    text = pc.utf8_trim_whitespace(column.fill_null('0'))
+    valid = pc.match_substring_regex(text, NUMBER_PATTERN).to_numpy(zero_copy_only=False)
+    valid &= pc.match_substring_regex(text, r'\d').to_numpy(zero_copy_only=False)
+    text = pc.if_else(pa.array(valid), text, '0')
+    parts = pc.extract_regex(text, NUMBER_PATTERN)
+    integer_digits = pc.utf8_ltrim(parts.field('integer'), '0')
+    # Integer parts beyond 18 digits don't fit int64; NUMBER(10,2) and real census values never come close
+    too_long = pc.greater(pc.utf8_length(integer_digits), min(precision - scale, 18)).to_numpy(zero_copy_only=False)
+    valid &= ~too_long
+    integer_digits = pc.if_else(pa.array(valid), integer_digits, '0')
+    fraction = pc.fill_null(parts.field('fraction'), '')
+    fraction = pc.utf8_rpad(pc.utf8_slice_codeunits(fraction, 0, scale + 1), scale + 1, '0')
+    integer = pc.cast(pc.if_else(pc.equal(integer_digits, ''), '0', integer_digits), pa.int64()).to_numpy()
+    fraction = pc.cast(fraction, pa.int64()).to_numpy()
+    negative = pc.equal(parts.field('sign'), '-').to_numpy(zero_copy_only=False)
+
+    unscaled = divide_half_away(integer * 10 ** (scale + 1) + fraction, 10)
+    unscaled = np.where(negative, -unscaled, unscaled)
+    # Rounding can carry into a new leading digit (99999999.995 -> 100000000.00), which overflows the column
+    valid &= np.abs(unscaled) < 10 ** precision if precision <= 18 else True
+    rejected = ~null & ~valid
+    return Number(np.where(null | rejected, 0, unscaled), scale, null | rejected), rejected
+
+
+def number_rejects(column, precision, scale):
+    """Rows parse_number would reject, for columns no silver model reads (one regex instead of a full parse)"""
+    column = empty_as_null(column)
+    digits = min(precision - scale, 18)
+    loadable = pc.match_substring_regex(column, rf'^\s*[+-]?0*(\d{{1,{digits}}}(\.\d*)?|\d{{0,{digits}}}\.\d+)\s*$')
+    if precision - scale <= 18:
+        carries = pc.match_substring_regex(column, rf'^\s*[+-]?0*9{{{digits}}}\.9{{{scale}}}[5-9]')
+        loadable = pc.and_(loadable, pc.invert(carries))
+    return pc.invert(pc.fill_null(loadable, True)).to_numpy(zero_copy_only=False)
+
+
+def parse_date(column):
+    """Load a CSV string column into DATE; returns date32 values and the rejected rows"""
+    column = empty_as_null(column)
+    null = column.is_null().to_numpy(zero_copy_only=False)
+    parsed = None
+    for date_format in DATE_FORMATS:
+        attempt = pc.strptime(column, format=date_format, unit='s', error_is_null=True)
+        parsed = attempt if parsed is None else pc.coalesce(parsed, attempt)
+    dates = pc.cast(pc.cast(parsed, pa.timestamp('s')), pa.date32())
+    rejected = ~null & dates.is_null().to_numpy(zero_copy_only=False)
+    return dates, rejected
+
+
+def parse_varchar(column, length):
+    too_long = pc.fill_null(pc.greater(pc.utf8_length(column), length), False).to_numpy(zero_copy_only=False)
+    return column, too_long
+
+
+def load_bronze(batch):
+    """Convert one CSV block to bronze values; rows with any unloadable value are dropped, like ON_ERROR = 'CONTINUE'"""
+    columns = {}
+    rejected = np.zeros(batch.num_rows, dtype=bool)
+    for name, sql_type in PBJ_BRONZE_COLUMNS:
+        column = batch.column(name)
+        if sql_type.startswith('NUMBER'):
+            precision, scale = (int(part) for part in sql_type[7:-1].split(','))
+            if name in SILVER_SOURCE_COLUMNS:
+                columns[name], column_rejected = parse_number(column, precision, scale)
+            else:
+                column_rejected = number_rejects(column, precision, scale)
+        elif sql_type == 'DATE':
+            columns[name], column_rejected = parse_date(column)
+        else:
+            columns[name], column_rejected = parse_varchar(column, int(sql_type[8:-1]))
+        rejected |= column_rejected
+    return columns, rejected
+
+
+def silver_columns(bronze):
+    """Every silver model column, computed row by row from the bronze values (dbt/silver/*.sql)"""
+    hours = {
+        'rn_hours': bronze['HRS_RN'], 'lpn_hours': bronze['HRS_LPN'], 'cna_hours': bronze['HRS_CNA'],
+        'rn_emp_hours': bronze['HRS_RN_emp'], 'rn_contract_hours': bronze['HRS_RN_ctr'],
+        'lpn_emp_hours': bronze['HRS_LPN_emp'], 'lpn_contract_hours': bronze['HRS_LPN_ctr'],
+        'cna_emp_hours': bronze['HRS_CNA_emp'], 'cna_contract_hours': bronze['HRS_CNA_ctr'],
+    }
+    # silver_nursing_staffing_cleaned
+    values = {name: column.coalesce(0) for name, column in hours.items()}
+    values['patient_census'] = bronze['MDSCENSUS'].coalesce(0)
+    census = values['patient_census']
+    total = values['rn_hours'] + values['lpn_hours'] + values['cna_hours']
+    employee = values['rn_emp_hours'] + values['lpn_emp_hours'] + values['cna_emp_hours']
+    contract = values['rn_contract_hours'] + values['lpn_contract_hours'] + values['cna_contract_hours']
+
+    # silver_staffing_efficiency and silver_operational_trends
+    values['rn_hours_per_patient'] = (values['rn_hours'] / census).round(2)
+    values['lpn_hours_per_patient'] = (values['lpn_hours'] / census).round(2)
+    values['cna_hours_per_patient'] = (values['cna_hours'] / census).round(2)
+    values['total_nursing_hours_per_patient'] = (total / census).round(2)
+    values['efficiency_ratio'] = values['total_nursing_hours_per_patient']
+    # silver_workload_distribution
+    values['total_nursing_hours'] = total
+    values['rn_percentage'] = ((values['rn_hours'] / total) * 100).round(1)
+    values['lpn_percentage'] = ((values['lpn_hours'] / total) * 100).round(1)
+    values['cna_percentage'] = ((values['cna_hours'] / total) * 100).round(1)
+    # silver_employment_analysis
+    values['total_employee_hours'] = employee
+    values['total_contract_hours'] = contract
+    values['contract_percentage'] = ((contract / employee) * 100).round(1)
+
+    filters = {
+        'census_positive': census.greater_than_zero(),
+        'hours_positive': total.greater_than_zero(),
+    }
+    return values, filters
+
+
+def compute_file(path, file_rank, block_size_mb=BLOCK_SIZE_MB):
+    """Read one CSV in blocks and return the wide silver table for its loadable rows, plus load stats"""
+    stats = {'file': path, 'rows_read': 0, 'rows_rejected': 0, 'rows_wrong_column_count': 0, 'bytes': os.path.getsize(path)}
+
+    def skip_row(row):
+        stats['rows_wrong_column_count'] += 1
+        return 'skip'
+
+    names = [name for name, _ in PBJ_BRONZE_COLUMNS]
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(column_names=names, skip_rows=1, block_size=block_size_mb * 1024 * 1024),
+        parse_options=pa_csv.ParseOptions(quote_char='"', invalid_row_handler=skip_row),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in names},
+            null_values=NULL_VALUES,
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False
+        )
+    )
+    tables = []
+    for batch in reader:
+        stats['rows_read'] += batch.num_rows
+        bronze, rejected = load_bronze(batch)
+        stats['rows_rejected'] += int(rejected.sum())
+        # silver_nursing_staffing_cleaned keeps rows with a facility and a date (its merge key)
+        keep = ~rejected & ~batch.column('PROVNUM').is_null().to_numpy(zero_copy_only=False)
+        keep &= ~bronze['WORKDATE'].is_null().to_numpy(zero_copy_only=False)
+        values, filters = silver_columns(bronze)
+        row_numbers = np.arange(stats['rows_read'] - batch.num_rows, stats['rows_read'], dtype=np.int64)
+        mask = pa.array(keep)
+        columns = {
+            'facility_id': bronze['PROVNUM'].filter(mask),
+            'facility_name': bronze['PROVNAME'].filter(mask),
+            'state': bronze['STATE'].filter(mask),
+            'work_date': bronze['WORKDATE'].filter(mask),
+        }
+        for name, number in values.items():
+            columns[name] = Number(number.unscaled[keep], number.scale, number.null[keep]).to_arrow()
+        for name, flags in filters.items():
+            columns[f"_{name}"] = pa.array(flags[keep])
+        columns['_file_rank'] = pa.array(np.full(int(keep.sum()), file_rank, dtype=np.int64))
+        columns['_row'] = pa.array(row_numbers[keep])
+        tables.append(pa.table(columns))
+    stats['rows_loaded'] = sum(table.num_rows for table in tables)
+    return pa.concat_tables(tables) if tables else None, stats
+
+
+def latest_per_key(wide):
+    """Keep one row per (facility_id, work_date): the latest file, then the last row in it.
+
+    In Snowflake the latest LOAD_TIMESTAMP wins; files are loaded in the order given here.
+    """
+    facility = pc.dictionary_encode(wide['facility_id'].combine_chunks()).indices.to_numpy()
+    work_date = pc.cast(wide['work_date'], pa.int32()).to_numpy()
+    file_rank = wide['_file_rank'].to_numpy()
+    row = wide['_row'].to_numpy()
+    order = np.lexsort((-row, -file_rank, work_date, facility))
+    facility, work_date = facility[order], work_date[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (facility[1:] != facility[:-1]) | (work_date[1:] != work_date[:-1])
+    return wide.take(pa.array(np.sort(order[first])))
+
+
+def build_models(wide):
+    """Split the deduplicated wide table into the five silver models, with each model's filter applied"""
+    days = pc.cast(wide['work_date'], pa.int32()).to_numpy()
+    month = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12 + 1
+    # EXTRACT(DOW ...) counts from Sunday = 0; 1970-01-01 was a Thursday
+    day_of_week = (days.astype(np.int64) + 4) % 7
+    wide = wide.append_column('month', pa.array(month)).append_column('day_of_week', pa.array(day_of_week))
+    model_filters = {
+        'silver_staffing_efficiency': '_census_positive',
+        'silver_operational_trends': '_census_positive',
+        'silver_workload_distribution': '_hours_positive',
+    }
+    models = {}
+    for model, columns in SILVER_MODELS.items():
+        table = wide.filter(wide[model_filters[model]]) if model in model_filters else wide
+        models[model] = table.select(list(columns))
+    return models
+
+
+def compare_models(models, reference_dir):
+    """Compare each model with a warehouse export (<reference_dir>/<model>.parquet), keyed on facility and date"""
+    report = {}
+    for model, local in models.items():
+        path = os.path.join(reference_dir, f"{model}.parquet")
+        if not os.path.exists(path):
+            continue
+        warehouse = pq.read_table(path)
+        warehouse = warehouse.rename_columns([name.lower() for name in warehouse.column_names])
+        local_rows = {key: row for key, row in rows_by_key(local)}
+        warehouse_rows = {key: row for key, row in rows_by_key(warehouse.select(list(local.column_names)))}
+        mismatched = {}
+        for key in local_rows.keys() & warehouse_rows.keys():
+            for column, value in local_rows[key].items():
+                if value != warehouse_rows[key][column]:
+                    mismatched[column] = mismatched.get(column, 0) + 1
+        report[model] = {
+            'local_rows': len(local_rows),
+            'warehouse_rows': len(warehouse_rows),
+            'only_local': len(local_rows.keys() - warehouse_rows.keys()),
+            'only_warehouse': len(warehouse_rows.keys() - local_rows.keys()),
+            'mismatched_values': mismatched,
+        }
+    return report
+
+
+def rows_by_key(table):
+    for row in table.to_pylist():
+        yield (row['facility_id'], row['work_date']), row
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='+', help='PBJ CSV files (.csv or .csv.gz), oldest load first')
+    parser.add_argument('--output', help='directory for <model>.parquet outputs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='parallel file workers')
+    parser.add_argument('--block-size-mb', type=int, default=BLOCK_SIZE_MB, help='CSV block size per read')
+    parser.add_argument('--compare', help='directory of warehouse exports (<model>.parquet) to compare with')
+    parser.add_argument('--json', help='also write the load stats and comparison to this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(compute_file, path, rank, args.block_size_mb) for rank, path in enumerate(args.files)
+        ]
+        results = [future.result() for future in futures]
+    wide_tables = [table for table, _ in results if table is not None]
+    file_stats = [stats for _, stats in results]
+    if not wide_tables:
+        print("No loadable rows")
+        sys.exit(1)
+
+    wide = pa.concat_tables(wide_tables)
+    deduplicated = latest_per_key(wide)
+    models = build_models(deduplicated)
+    elapsed = time.perf_counter() - started
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for model, table in models.items():
+            pq.write_table(table, os.path.join(args.output, f"{model}.parquet"))
+
+    megabytes = sum(stats['bytes'] for stats in file_stats) / (1024 * 1024)
+    summary = {
+        'files': len(args.files),
+        'rows_read': sum(stats['rows_read'] for stats in file_stats),
+        'rows_rejected': sum(stats['rows_rejected'] for stats in file_stats),
+        'rows_wrong_column_count': sum(stats['rows_wrong_column_count'] for stats in file_stats),
+        'duplicates_dropped': wide.num_rows - deduplicated.num_rows,
+        'model_rows': {model: table.num_rows for model, table in models.items()},
+        'seconds': round(elapsed, 3),
+        'megabytes_per_second': round(megabytes / elapsed, 1),
+    }
+    print(json.dumps(summary, indent=2))
+
+    comparison = None
+    if args.compare:
+        comparison = compare_models(models, args.compare)
+        print(json.dumps(comparison, indent=2, default=str))
+
+    if args.json:
+        with open(args.json, 'w') as output_file:
+            json.dump({'summary': summary, 'files': file_stats, 'comparison': comparison}, output_file, indent=2)
+
+    if comparison and any(
+        result['only_local'] or result['only_warehouse'] or result['mismatched_values'] for result in comparison.values()
+    ):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
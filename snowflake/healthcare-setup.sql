@@ -125,12 +125,17 @@ CREATE OR REPLACE TABLE HEALTHCARE_ANALYTICS.BRONZE.NH_StateUSAverages_Oct2024 (
 
 -- INITIAL DATA LOAD
 COPY INTO HEALTHCARE_ANALYTICS.BRONZE.PBJ_Daily_Nurse_Staffing_Q2_2024
+    (PROVNUM, PROVNAME, CITY, STATE, COUNTY_NAME, COUNTY_FIPS, CY_Qtr, WORKDATE, MDSCENSUS,
+     HRS_RNDON, HRS_RNDON_tmp, HRS_RNDON_ctr, HRS_RNADMIN, HRS_RNADMIN_emp, HRS_RNADMIN_ctr,
+     HRS_RN, HRS_RN_emp, HRS_RN_ctr, HRS_LPNADMIN, HRS_LPNADMIN_emp, HRS_LPNADMIN_ctr,
+     HRS_LPN, HRS_LPN_emp, HRS_LPN_ctr, HRS_CNA, HRS_CNA_emp, HRS_CNA_ctr,
+     HRS_NATRN, HRS_NATRN_emp, HRS_NATRN_ctr, HRS_MEDAIDE, HRS_MEDAIDE_emp, HRS_MEDAIDE_ctr)
 FROM (
     SELECT
         t.$1, t.$2, t.$3, t.$4, t.$5, t.$6, t.$7, t.$8, t.$9,
         t.$10, t.$11, t.$12, t.$13, t.$14, t.$15, t.$16, t.$17,
         t.$18, t.$19, t.$20, t.$21, t.$22, t.$23, t.$24, t.$25,
-        t.$26, t.$27, t.$28, t.$29, t.$30, t.$31, t.$32, t.$33, t.$34
+        t.$26, t.$27, t.$28, t.$29, t.$30, t.$31, t.$32, t.$33
     FROM @HEALTHCARE_ANALYTICS.BRONZE.S3_HEALTHCARE_STAGE/PBJ_Daily_Nurse_Staffing_Q2_2024.csv
     (FILE_FORMAT => HEALTHCARE_ANALYTICS.BRONZE.CSV_FORMAT_NO_ERROR) t
 )
@@ -170,12 +175,17 @@ CREATE OR REPLACE PIPE HEALTHCARE_ANALYTICS.BRONZE.pbj_staffing_pipe
 AUTO_INGEST = TRUE
 AS
 COPY INTO HEALTHCARE_ANALYTICS.BRONZE.PBJ_Daily_Nurse_Staffing_Q2_2024
+    (PROVNUM, PROVNAME, CITY, STATE, COUNTY_NAME, COUNTY_FIPS, CY_Qtr, WORKDATE, MDSCENSUS,
+     HRS_RNDON, HRS_RNDON_tmp, HRS_RNDON_ctr, HRS_RNADMIN, HRS_RNADMIN_emp, HRS_RNADMIN_ctr,
+     HRS_RN, HRS_RN_emp, HRS_RN_ctr, HRS_LPNADMIN, HRS_LPNADMIN_emp, HRS_LPNADMIN_ctr,
+     HRS_LPN, HRS_LPN_emp, HRS_LPN_ctr, HRS_CNA, HRS_CNA_emp, HRS_CNA_ctr,
+     HRS_NATRN, HRS_NATRN_emp, HRS_NATRN_ctr, HRS_MEDAIDE, HRS_MEDAIDE_emp, HRS_MEDAIDE_ctr)
 FROM (
     SELECT
         t.$1, t.$2, t.$3, t.$4, t.$5, t.$6, t.$7, t.$8, t.$9,
         t.$10, t.$11, t.$12, t.$13, t.$14, t.$15, t.$16, t.$17,
         t.$18, t.$19, t.$20, t.$21, t.$22, t.$23, t.$24, t.$25,
-        t.$26, t.$27, t.$28, t.$29, t.$30, t.$31, t.$32, t.$33, t.$34
+        t.$26, t.$27, t.$28, t.$29, t.$30, t.$31, t.$32, t.$33
     FROM @HEALTHCARE_ANALYTICS.BRONZE.S3_HEALTHCARE_STAGE/PBJ_Daily_Nurse_Staffing_Q2_2024.csv
     (FILE_FORMAT => HEALTHCARE_ANALYTICS.BRONZE.CSV_FORMAT_NO_ERROR) t
 )
@@ -0,0 +1,143 @@
+"""Local stand-in for the snowflake.connector calls made by the dashboard.
+
+Synthetic gold tables are generated with numpy and loaded into an in-memory
+SQLite database. install() replaces snowflake.connector.connect so that the
+dashboard's connection pool, query pushdown and local replica all run
+against it. SQLite runs the dashboard's SQL after a few Snowflake-only
+spellings are translated.
+"""
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import snowflake.connector
+
+FACILITY_TABLE = 'GOLD_FACILITY_PERFORMANCE_SUMMARY'
+STATE_TABLE = 'GOLD_STATE_BENCHMARKS'
+STATES = [
+    'AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 'IN', 'KS', 'KY',
+    'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 'NH', 'NJ', 'NM', 'NV', 'NY', 'OH',
+    'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA', 'WI', 'WV', 'WY',
+]
+NAME_PREFIXES = ['SPRINGFIELD', 'RIVERSIDE', 'OAK GROVE', 'ST. MARY\'S', 'LAKEVIEW', 'MAPLE', 'HILLCREST', 'PINE RIDGE']
+NAME_SUFFIXES = [
+    'HEALTH AND REHABILITATION CENTER', 'NURSING HOME', 'CARE CENTER', 'SKILLED NURSING FACILITY',
+    'MANOR', 'LIVING CENTER'
+]
+# Share of NULLs in these metric columns, so NULL handling is exercised as well
+# (not the census: the scatter sizes its markers by it)
+NULLABLE_COLUMNS = ('AVG_HOURS_PER_PATIENT', 'AVG_CONTRACT_PERCENTAGE', 'AVG_RN_PERCENTAGE')
+NULL_RATE = 0.01
+
+def generate_gold_tables(rows, seed=0):
+    """Facility summary with `rows` facilities and the state benchmarks derived from it"""
+    rng = np.random.default_rng(seed)
+    prefixes = np.array(NAME_PREFIXES, dtype=object)[rng.integers(0, len(NAME_PREFIXES), rows)]
+    suffixes = np.array(NAME_SUFFIXES, dtype=object)[rng.integers(0, len(NAME_SUFFIXES), rows)]
+    facilities = pd.DataFrame({
+        'FACILITY_NAME': [f"{prefix} {suffix} {i}" for i, (prefix, suffix) in enumerate(zip(prefixes, suffixes))],
+        'STATE': np.array(STATES, dtype=object)[rng.integers(0, len(STATES), rows)],
+        'AVG_HOURS_PER_PATIENT': rng.gamma(9.0, 0.4, rows).round(2),
+        'AVG_CONTRACT_PERCENTAGE': (rng.beta(1.2, 8.0, rows) * 100).round(1),
+        'AVG_PATIENT_CENSUS': rng.normal(85, 30, rows).clip(5, 400).round(1),
+        'AVG_RN_PERCENTAGE': (rng.beta(2.0, 9.0, rows) * 100).round(1),
+    })
+    for column in NULLABLE_COLUMNS:
+        facilities.loc[rng.random(rows) < NULL_RATE, column] = np.nan
+    states = (
+        facilities.groupby('STATE', as_index=False)['AVG_HOURS_PER_PATIENT'].mean()
+        .rename(columns={'AVG_HOURS_PER_PATIENT': 'STATE_AVG_HOURS_PER_PATIENT'})
+        .round({'STATE_AVG_HOURS_PER_PATIENT': 2})
+    )
+    return {FACILITY_TABLE: facilities, STATE_TABLE: states}
+
+def to_sqlite(query):
+    """Translate the Snowflake-only spellings the dashboard uses"""
+    query = query.replace('%s', '?')
+    # SQLite's LIKE is already case-insensitive for ASCII, which matches ILIKE on these names
+    return re.sub(r'\bILIKE\b', 'LIKE', query)
+
+class FakeWarehouse:
+    """In-memory SQLite copy of the gold tables; every fake connection queries it"""
+
+    def __init__(self, tables, version, query_latency=0.0):
+        self.version = version
+        self.query_latency = query_latency
+        self.lock = threading.Lock()
+        self.database = sqlite3.connect(':memory:', check_same_thread=False)
+        for name, frame in tables.items():
+            frame.to_sql(name, self.database, index=False)
+        self.query_counts = {}
+
+    def execute(self, query, params):
+        if self.query_latency:
+            time.sleep(self.query_latency)
+        if 'INFORMATION_SCHEMA.TABLES' in query:
+            self.count('information_schema')
+            return ['TABLE_NAME', 'LAST_ALTERED'], [(table, self.version) for table in params]
+        self.count('select_star' if query.lstrip().upper().startswith('SELECT *') else 'select')
+        with self.lock:
+            cursor = self.database.execute(to_sqlite(query), tuple(params or ()))
+            rows = cursor.fetchall()
+        return [column[0] for column in cursor.description], rows
+
+    def count(self, kind):
+        with self.lock:
+            self.query_counts[kind] = self.query_counts.get(kind, 0) + 1
+
+class FakeCursor:
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+        self.columns = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.columns, self.rows = self.warehouse.execute(query, params)
+        return self
+
+    @property
+    def description(self):
+        return [(column, None, None, None, None, None, True) for column in self.columns]
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetch_pandas_all(self):
+        return pd.DataFrame.from_records(self.rows, columns=self.columns)
+
+    def fetch_pandas_batches(self, batch_size=10000):
+        for start in range(0, len(self.rows), batch_size):
+            yield pd.DataFrame.from_records(self.rows[start:start + batch_size], columns=self.columns)
+
+    def fetch_arrow_all(self):
+        if not self.rows:
+            return None
+        return pa.Table.from_pandas(self.fetch_pandas_all(), preserve_index=False)
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self.warehouse)
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+def install(warehouse):
+    """Route snowflake.connector.connect to the fake warehouse (for connections opened from now on)"""
+    snowflake.connector.connect = lambda **connect_args: FakeConnection(warehouse)
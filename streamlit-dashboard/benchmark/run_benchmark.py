@@ -0,0 +1,202 @@
+"""Benchmark streamlit_app.py headlessly against a fake Snowflake holding synthetic gold tables.
+
+For each table size, drives the dashboard with Streamlit's AppTest harness through a fixed
+script of interactions (connect, switch sections, filter by state, search, sort) and reports
+each interaction's rerun latency, peak RSS and the size of the charts and tables it sends.
+
+Usage:
+    python run_benchmark.py --rows 1000 10000 100000 1000000 --mode replica
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import fake_snowflake
+
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(DASHBOARD_DIR, 'streamlit_app.py')
+# st.error messages the dashboard shows for failures (it also uses st.error to highlight a state)
+ERROR_PREFIXES = ('Connection failed', 'Error loading data')
+SECTIONS = ["🏥 Facility Performance", "🗺️ State Analysis", "📊 Staffing Analysis", "📋 Data Tables"]
+
+def rss_bytes():
+    """Resident set size now; without /proc (macOS), the peak so far"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class PeakRss:
+    """Highest RSS seen while the block runs, polled every 10 ms"""
+
+    def __enter__(self):
+        self.peak = rss_bytes()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+        return self
+
+    def _poll(self):
+        while not self.done.wait(0.01):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+        self.thread.join()
+
+def by_label(elements, label):
+    return next(element for element in elements if element.label == label)
+
+def interactions(search_term, state):
+    """(name, action) pairs run in order against one AppTest; each action returns the widget to rerun from"""
+    def connect(app):
+        by_label(app.text_input, "Password").input('benchmark')
+        return app.sidebar.button[0].click()
+
+    def section(name):
+        return lambda app: app.radio(key='active_section').set_value(name)
+
+    return [
+        ('initial load', lambda app: app),
+        ('connect', connect),
+        ('filter by state', lambda app: app.selectbox(key='facility_state_filter').set_value(state)),
+        ('state analysis', section(SECTIONS[1])),
+        ('staffing analysis', section(SECTIONS[2])),
+        ('data tables', section(SECTIONS[3])),
+        ('search', lambda app: by_label(app.text_input, "🔍 Search facilities:").input(search_term)),
+        ('sort', lambda app: app.selectbox(key='sort_option').set_value('AVG_PATIENT_CENSUS')),
+        ('sort descending', lambda app: by_label(app.radio, "Sort order:").set_value('Descending')),
+        ('facility performance (warm)', section(SECTIONS[0])),
+    ]
+
+def payload_sizes(app):
+    """Bytes the browser would receive for the charts and tables on screen"""
+    charts = [len(element.proto.spec) for element in app.get('plotly_chart')]
+    tables = [len(element.proto.data) for element in app.dataframe]
+    return {
+        'charts': len(charts),
+        'chart_bytes': sum(charts),
+        'tables': len(tables),
+        'table_bytes': sum(tables),
+    }
+
+def run_size(rows, args, replica_dir):
+    import snowflake_pool
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    tables = fake_snowflake.generate_gold_tables(rows, seed=args.seed)
+    warehouse = fake_snowflake.FakeWarehouse(
+        tables, version=f"synthetic-{rows}", query_latency=args.query_latency_ms / 1000
+    )
+    del tables
+    fake_snowflake.install(warehouse)
+    # A fresh process-wide cache per size, as after a deploy
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    snowflake_pool.close_pools()
+
+    app = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    results = []
+    for name, action in interactions(args.search, args.state):
+        warehouse.query_counts.clear()
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with PeakRss() as rss, output:
+            target = action(app)
+            started = time.perf_counter()
+            target.run()
+            elapsed = time.perf_counter() - started
+        errors = [element.value for element in app.exception] + [
+            element.value for element in app.error if element.value.startswith(ERROR_PREFIXES)
+        ]
+        results.append(dict(
+            {
+                'rows': rows,
+                'interaction': name,
+                'seconds': round(elapsed, 3),
+                'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+                'queries': dict(warehouse.query_counts),
+                'errors': errors,
+            },
+            **payload_sizes(app)
+        ))
+    shutil.rmtree(replica_dir, ignore_errors=True)
+    return results
+
+def compare(results, baseline_path, threshold):
+    """Interactions whose latency grew by more than threshold (a fraction) since the baseline run"""
+    with open(baseline_path) as baseline_file:
+        baseline = {(result['rows'], result['interaction']): result for result in json.load(baseline_file)['results']}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['rows'], result['interaction']))
+        # Sub-10ms reruns are mostly noise
+        if previous and previous['seconds'] >= 0.01 and result['seconds'] > previous['seconds'] * (1 + threshold):
+            regressions.append((result, previous))
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='facility table sizes to benchmark')
+    parser.add_argument('--mode', choices=['replica', 'pushdown'], default='replica',
+                        help='serve from the local replica (default) or query the warehouse directly')
+    parser.add_argument('--search', default='riverside care', help='term typed into the facility search')
+    parser.add_argument('--state', default='CA', help='state picked in the facility state filter')
+    parser.add_argument('--query-latency-ms', type=float, default=0, help='simulated round trip per query')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic tables')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds allowed per rerun')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON from an earlier run to compare latencies against')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='with --baseline, exit non-zero if an interaction got slower by more than this fraction')
+    parser.add_argument('--verbose', action='store_true', help='show the dashboard output')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # The replica lives in a scratch directory; both settings are read when the dashboard modules load
+    replica_dir = tempfile.mkdtemp(prefix='dashboard-benchmark-')
+    os.environ['DASHBOARD_REPLICA_DIR'] = replica_dir
+    os.environ['DASHBOARD_LOCAL_REPLICA'] = 'true' if args.mode == 'replica' else 'false'
+    sys.path.insert(0, DASHBOARD_DIR)
+
+    results = []
+    for rows in args.rows:
+        results.extend(run_size(rows, args, replica_dir))
+
+    print(f"{'rows':>8} {'interaction':<28} {'sec':>7} {'peakRSS':>8} {'charts':>6} {'chart KB':>9} "
+          f"{'table KB':>9}  queries")
+    for result in results:
+        print(f"{result['rows']:>8} {result['interaction']:<28} {result['seconds']:>7.3f} "
+              f"{result['peak_rss_mb']:>7.1f}M {result['charts']:>6} {result['chart_bytes'] / 1024:>9.1f} "
+              f"{result['table_bytes'] / 1024:>9.1f}  {json.dumps(result['queries'], sort_keys=True)}")
+        for error in result['errors']:
+            print(f"    error: {error}")
+
+    if args.json:
+        with open(args.json, 'w') as output_file:
+            json.dump({'args': vars(args), 'results': results}, output_file, indent=2)
+
+    failed = any(result['errors'] for result in results)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        for result, previous in regressions:
+            print(f"REGRESSION {result['rows']} rows, {result['interaction']}: "
+                  f"{previous['seconds']:.3f}s -> {result['seconds']:.3f}s")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Chart builders for large tables: binned on the server so the browser payload stays bounded."""
+import numpy as np
+import plotly.graph_objects as go
+
+# Up to this many points are drawn as regular SVG markers
+SVG_POINT_LIMIT = 5000
+# Up to this many points (in the zoomed window) are drawn individually with WebGL
+WEBGL_POINT_LIMIT = 50000
+DENSITY_BINS = 150
+
+
+def binned_histogram(values, bins, title, x_title, y_title='Number of Facilities'):
+    """Histogram whose bars are counted here; the figure carries `bins` bars whatever the row count"""
+    values = np.asarray(values, dtype='float64')
+    values = values[~np.isnan(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate='%{customdata[0]:.1f} - %{customdata[1]:.1f}: %{y:,} facilities<extra></extra>'
+    ))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title, bargap=0)
+    return fig
+
+
+def density_heatmap(x, y, x_range, y_range, title, x_title, y_title, bins=DENSITY_BINS):
+    """2-D histogram of (x, y) as a heatmap of point counts; empty cells are left transparent"""
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    valid = ~(np.isnan(x) | np.isnan(y))
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=bins, range=[x_range, y_range])
+    fig = go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=np.where(counts > 0, counts, np.nan).T,
+        colorscale='Viridis',
+        colorbar={'title': 'Facilities'},
+        hovertemplate=f'{x_title}: %{{x:.1f}}<br>{y_title}: %{{y:.2f}}<br>%{{z:,}} facilities<extra></extra>'
+    ))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title)
+    return fig
@@ -0,0 +1,58 @@
+"""Warehouse-side aggregation of the daily silver trends for the drill-down view.
+
+silver_operational_trends holds one row per facility and day (1.3M+ rows), so
+the dashboard never reads it whole. A TrendSlice asks Snowflake for one
+facility's or state's rows in a date window, rolled up to day, week or month
+buckets, so the result grows with the window rather than with the table.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+# Built by dbt in the silver schema of the same database the dashboard connects to
+TRENDS_TABLE = 'SILVER.SILVER_OPERATIONAL_TRENDS'
+GRANULARITIES = {'Day': 'DAY', 'Week': 'WEEK', 'Month': 'MONTH'}
+
+
+@dataclass(frozen=True)
+class TrendSlice:
+    """One drill-down request: a state (facility=None) or one facility in it, a window and a bucket size"""
+    state: str
+    facility: str = None
+    granularity: str = 'Week'
+    start: date = None
+    end: date = None
+
+    def __post_init__(self):
+        if self.granularity not in GRANULARITIES:
+            raise ValueError(f"Unsupported granularity: {self.granularity}")
+        if self.start is None or self.end is None or self.start > self.end:
+            raise ValueError(f"Invalid window: {self.start} - {self.end}")
+
+    def to_sql(self):
+        """SQL text and parameters (pyformat); only the whitelisted bucket name is inlined"""
+        bucket = GRANULARITIES[self.granularity]
+        conditions = ['STATE = %s', 'WORK_DATE BETWEEN %s AND %s']
+        params = [self.state, self.start, self.end]
+        if self.facility is not None:
+            conditions.append('FACILITY_NAME = %s')
+            params.append(self.facility)
+        # Hours per patient day weights every day by its census, unlike the mean of daily ratios
+        sql = f"""
+            SELECT
+                DATE_TRUNC('{bucket}', WORK_DATE) AS PERIOD_START,
+                COUNT(DISTINCT WORK_DATE) AS DAYS,
+                COUNT(DISTINCT FACILITY_ID) AS FACILITIES,
+                SUM(PATIENT_CENSUS) / COUNT(DISTINCT WORK_DATE) AS AVG_DAILY_CENSUS,
+                SUM(TOTAL_NURSING_HOURS) AS TOTAL_NURSING_HOURS,
+                SUM(TOTAL_NURSING_HOURS) / NULLIF(SUM(PATIENT_CENSUS), 0) AS HOURS_PER_PATIENT_DAY,
+                AVG(EFFICIENCY_RATIO) AS AVG_EFFICIENCY_RATIO
+            FROM {TRENDS_TABLE}
+            WHERE {' AND '.join(conditions)}
+            GROUP BY 1
+            ORDER BY 1
+        """
+        return sql, tuple(params)
+
+
+def date_bounds_sql():
+    return f"SELECT MIN(WORK_DATE) AS FIRST_DATE, MAX(WORK_DATE) AS LAST_DATE FROM {TRENDS_TABLE}"
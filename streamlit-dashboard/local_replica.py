@@ -0,0 +1,175 @@
+"""On-disk columnar replica of the gold tables the dashboard reads.
+
+Each table is stored as an uncompressed Arrow IPC file and read through a
+memory map, so opening it is near-instant and every Streamlit worker on the
+host shares the same OS page cache instead of holding its own DataFrame.
+A table is re-fetched only when its upstream data version changes.
+
+Workers on the same host share one replica. Refreshes are serialized with a
+flock on manifest.lock, and a reader holds a shared flock on every file it
+has mapped, so a refresh never deletes a file another process is reading.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes are only serialized within the process
+    fcntl = None
+
+import pyarrow as pa
+
+from profiling import timed
+
+REPLICA_DIR = os.environ.get(
+    'DASHBOARD_REPLICA_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'healthcare-dashboard')
+)
+
+
+class LocalReplica:
+    """Replica of one connection target's tables under REPLICA_DIR/<target hash>/"""
+
+    def __init__(self, target, root=REPLICA_DIR):
+        self.target = target
+        self.directory = os.path.join(root, hashlib.sha1(repr(target).encode('utf-8')).hexdigest()[:16])
+        self.manifest_path = os.path.join(self.directory, 'manifest.json')
+        self.lock = threading.Lock()
+        self._cached_manifest = (None, {})
+
+    def manifest(self):
+        """Table name -> {'version', 'path', 'previous', 'rows', 'refreshed_at'}
+
+        Re-parsed only when the file changes, so other workers' refreshes are still seen.
+        """
+        try:
+            stat = os.stat(self.manifest_path)
+        except OSError:
+            return {}
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached_signature, cached = self._cached_manifest
+        if signature == cached_signature:
+            return cached
+        try:
+            with open(self.manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+        self._cached_manifest = (signature, manifest)
+        return manifest
+
+    def versions(self):
+        return {table: entry['version'] for table, entry in self.manifest().items()}
+
+    def is_available(self):
+        return bool(self.manifest())
+
+    def refresh(self, pool, table_versions):
+        """Re-fetch tables whose upstream version differs from the local copy; returns the refreshed names"""
+        with self.lock, self._file_lock():
+            # Read under the lock: another process may have refreshed these tables while we waited
+            manifest = dict(self.manifest())
+            stale = [table for table, version in table_versions.items()
+                     if manifest.get(table, {}).get('version') != version]
+            for table in stale:
+                path = os.path.join(self.directory, f"{table}-{int(time.time() * 1000)}.arrow")
+                rows = self._download(pool, table, path)
+                previous = manifest.get(table, {}).get('path')
+                manifest[table] = {
+                    'version': table_versions[table],
+                    'path': os.path.basename(path),
+                    'previous': previous,
+                    'rows': rows,
+                    'refreshed_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+                }
+                self._write_manifest(manifest)
+                self._remove_old_files(table, keep={manifest[table]['path'], previous})
+            return stale
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process using this replica directory"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'manifest.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _remove_old_files(self, table, keep):
+        # The previous file is kept for workers that read the old manifest but haven't mapped it yet.
+        # Older files are removed only once no process holds them mapped; a busy file is retried next refresh
+        for name in os.listdir(self.directory):
+            if name.startswith(f"{table}-") and name.endswith('.arrow') and name not in keep:
+                remove_unless_mapped(os.path.join(self.directory, name))
+
+    def _download(self, pool, table, path):
+        with pool.cursor() as cursor:
+            # Table names come from the dashboard's fixed list, never from user input
+            with timed('query', f"SELECT * FROM {table}"):
+                cursor.execute(f"SELECT * FROM {table}")
+            with timed('fetch', 'fetch_arrow_all') as event:
+                arrow_table = cursor.fetch_arrow_all()
+                if arrow_table is None:
+                    arrow_table = pa.table({column[0]: pa.array([], type=pa.null()) for column in cursor.description})
+                event.update(rows=arrow_table.num_rows, bytes=arrow_table.nbytes)
+        arrow_table = decimals_to_float(arrow_table)
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with timed('replica_write', table, bytes=arrow_table.nbytes):
+            with pa.OSFile(temporary_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                    writer.write_table(arrow_table)
+            os.replace(temporary_path, path)
+        return arrow_table.num_rows
+
+    def _write_manifest(self, manifest):
+        temporary_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temporary_path, self.manifest_path)
+
+    def table_path(self, table):
+        entry = self.manifest().get(table)
+        return os.path.join(self.directory, entry['path']) if entry else None
+
+
+def read_table(path):
+    """Memory-map an Arrow IPC file; the returned table references the mapped pages without copying
+
+    The file stays share-locked until the table is garbage collected, which keeps refreshes from removing it.
+    """
+    source = pa.memory_map(path, 'r')
+    if fcntl is not None:
+        fcntl.flock(source.fileno(), fcntl.LOCK_SH)
+    arrow_table = pa.ipc.open_file(source).read_all()
+    weakref.finalize(arrow_table, source.close)
+    return arrow_table
+
+
+def remove_unless_mapped(path):
+    """Delete a replica file unless a reader holds its shared lock"""
+    try:
+        with open(path, 'rb') as replica_file:
+            if fcntl is not None:
+                fcntl.flock(replica_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def decimals_to_float(arrow_table):
+    """Store NUMBER(p,s) columns as float64, as fetch_pandas_all would return them"""
+    fields = [
+        pa.field(field.name, pa.float64()) if pa.types.is_decimal(field.type) else field
+        for field in arrow_table.schema
+    ]
+    return arrow_table.cast(pa.schema(fields))
@@ -0,0 +1,129 @@
+"""Opt-in timing of dashboard queries, transforms, cache lookups, sections and figures.
+
+The profiler lives in the session state and is active only while the debug
+panel checkbox is on, so the helpers below are no-ops for everyone else.
+"""
+import functools
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import streamlit as st
+
+MAX_RUNS = 20
+
+
+class Profiler:
+    """Keeps the events of the last MAX_RUNS script runs (fragment reruns add to the latest one)"""
+
+    def __init__(self, max_runs=MAX_RUNS):
+        self.runs = deque(maxlen=max_runs)
+        self.cache_misses = 0
+        self.run_count = 0
+
+    def start_run(self):
+        self.run_count += 1
+        self.runs.append({
+            'run': self.run_count,
+            'started_at': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+            'events': []
+        })
+
+    def record(self, kind, name, **fields):
+        if not self.runs:
+            self.start_run()
+        event = {'kind': kind, 'name': name, **fields}
+        self.runs[-1]['events'].append(event)
+        return event
+
+    def summary(self, run=None):
+        """Totals per kind for one run (the latest by default)"""
+        run = run or (self.runs[-1] if self.runs else {'events': []})
+        totals = {}
+        for event in run['events']:
+            total = totals.setdefault(event['kind'], {'count': 0, 'ms': 0.0})
+            total['count'] += 1
+            total['ms'] = round(total['ms'] + event.get('ms', 0.0), 3)
+            for field in ('rows', 'bytes'):
+                if field in event:
+                    total[field] = total.get(field, 0) + event[field]
+            if event['kind'] == 'cache':
+                total[event['result']] = total.get(event['result'], 0) + 1
+        return totals
+
+    def to_json(self):
+        return json.dumps({
+            'exported_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'runs': [dict(run, summary=self.summary(run)) for run in self.runs]
+        }, indent=2, default=str)
+
+
+def current():
+    """The session's profiler if the debug panel is on, else None"""
+    try:
+        if st.session_state.get('debug_profiling'):
+            return st.session_state.setdefault('profiler', Profiler())
+    except Exception:
+        # No script run context (e.g. a background thread)
+        pass
+    return None
+
+
+@contextmanager
+def timed(kind, name, **fields):
+    """Time a block; the yielded dict can be filled with extra fields such as rows and bytes"""
+    profiler = current()
+    extra = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        if profiler is not None:
+            profiler.record(kind, name, ms=round((time.perf_counter() - started) * 1000, 3), **extra)
+
+
+def profiled(kind, name):
+    """Decorator form of timed()"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(kind, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def note_cache_miss():
+    """Call at the top of a cached function's body: it only runs on a miss"""
+    profiler = current()
+    if profiler is not None:
+        profiler.cache_misses += 1
+
+
+def cache_call(name, function, *args, **kwargs):
+    """Call a cached function and record whether it was a hit or a miss"""
+    profiler = current()
+    if profiler is None:
+        return function(*args, **kwargs)
+    misses_before = profiler.cache_misses
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    profiler.record(
+        'cache', name,
+        ms=round((time.perf_counter() - started) * 1000, 3),
+        result='miss' if profiler.cache_misses > misses_before else 'hit'
+    )
+    return result
+
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(deep=True).sum()) if frame is not None else 0
+
+
+def figure_payload_bytes(fig):
+    """Size of the JSON the browser receives for a figure; only computed while profiling"""
+    if current() is None:
+        return None
+    return len(fig.to_json())
@@ -0,0 +1,238 @@
+"""Build parameterized, column-projected Snowflake queries for the dashboard widgets.
+
+A QuerySpec describes what one widget needs (columns, filters, search, sort,
+top-N). to_sql() pushes it down to Snowflake, apply() runs the same spec in
+pandas against an already-fetched table, and apply_arrow() runs it against
+an Arrow table such as the memory-mapped local replica.
+"""
+from dataclasses import dataclass
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Tables and columns a query may reference; anything else is rejected before reaching SQL
+TABLE_COLUMNS = {
+    'GOLD_FACILITY_PERFORMANCE_SUMMARY': (
+        'FACILITY_NAME', 'STATE', 'AVG_HOURS_PER_PATIENT', 'AVG_CONTRACT_PERCENTAGE',
+        'AVG_PATIENT_CENSUS', 'AVG_RN_PERCENTAGE'
+    ),
+    'GOLD_STATE_BENCHMARKS': ('STATE', 'STATE_AVG_HOURS_PER_PATIENT'),
+}
+COMPARISON_OPERATORS = ('=', '!=', '>', '>=', '<', '<=')
+AGGREGATE_FUNCTIONS = {'AVG': 'mean', 'MIN': 'min', 'MAX': 'max', 'SUM': 'sum', 'COUNT': 'count'}
+ARROW_COMPARISONS = {
+    '=': pc.equal, '!=': pc.not_equal, '>': pc.greater,
+    '>=': pc.greater_equal, '<': pc.less, '<=': pc.less_equal
+}
+LIKE_ESCAPE = '!'
+
+
+@dataclass(frozen=True)
+class QuerySpec:
+    """One widget's query.
+
+    filters: (column, operator, value) triples, or (column, 'NOT NULL') pairs
+    search: (columns, term) - case-insensitive substring match on any of the columns
+    aggregates: (function, column or '*', alias) triples, grouped by group_by
+    order_by: (column, descending) pairs; NULLs always sort last
+    """
+    table: str
+    columns: tuple = ()
+    filters: tuple = ()
+    search: tuple = ()
+    aggregates: tuple = ()
+    group_by: tuple = ()
+    order_by: tuple = ()
+    distinct: bool = False
+    limit: int = None
+
+    def __post_init__(self):
+        allowed = TABLE_COLUMNS.get(self.table)
+        if allowed is None:
+            raise ValueError(f"Unknown table: {self.table}")
+        referenced = list(self.columns) + list(self.group_by)
+        referenced += [condition[0] for condition in self.filters]
+        referenced += list(self.search[0]) if self.search else []
+        referenced += [column for _, column, _ in self.aggregates if column != '*']
+        for column in referenced:
+            if column not in allowed:
+                raise ValueError(f"Unknown column for {self.table}: {column}")
+        output_columns = self.output_columns()
+        for column, _ in self.order_by:
+            if column not in output_columns:
+                raise ValueError(f"Cannot order by {column}: not selected")
+        for condition in self.filters:
+            if len(condition) == 3 and condition[1] not in COMPARISON_OPERATORS:
+                raise ValueError(f"Unsupported operator: {condition[1]}")
+            if len(condition) == 2 and condition[1] != 'NOT NULL':
+                raise ValueError(f"Unsupported condition: {condition}")
+        for function, _, alias in self.aggregates:
+            if function not in AGGREGATE_FUNCTIONS:
+                raise ValueError(f"Unsupported aggregate: {function}")
+            if not alias.isidentifier():
+                raise ValueError(f"Invalid alias: {alias}")
+        if self.limit is not None and (not isinstance(self.limit, int) or self.limit < 0):
+            raise ValueError(f"Invalid limit: {self.limit}")
+
+    def output_columns(self):
+        if self.aggregates:
+            return tuple(self.group_by) + tuple(alias for _, _, alias in self.aggregates)
+        return tuple(self.columns) or TABLE_COLUMNS[self.table]
+
+    def to_sql(self):
+        """SQL text and parameters (pyformat, as snowflake.connector expects)"""
+        params = []
+        if self.aggregates:
+            select = list(self.group_by) + [
+                f"{function}({column}) AS {alias}" for function, column, alias in self.aggregates
+            ]
+        else:
+            select = list(self.output_columns())
+        sql = f"SELECT {'DISTINCT ' if self.distinct else ''}{', '.join(select)} FROM {self.table}"
+
+        conditions = []
+        for condition in self.filters:
+            if len(condition) == 2:
+                conditions.append(f"{condition[0]} IS NOT NULL")
+            else:
+                conditions.append(f"{condition[0]} {condition[1]} %s")
+                params.append(condition[2])
+        if self.search:
+            columns, term = self.search
+            conditions.append('(' + ' OR '.join(f"{column} ILIKE %s ESCAPE '{LIKE_ESCAPE}'" for column in columns) + ')')
+            params.extend([f"%{escape_like(term)}%"] * len(columns))
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if self.aggregates and self.group_by:
+            sql += ' GROUP BY ' + ', '.join(self.group_by)
+        if self.order_by:
+            sql += ' ORDER BY ' + ', '.join(
+                f"{column} {'DESC' if descending else 'ASC'} NULLS LAST" for column, descending in self.order_by
+            )
+        if self.limit is not None:
+            sql += f" LIMIT {self.limit}"
+        return sql, tuple(params)
+
+    def apply(self, df):
+        """Evaluate the spec in pandas against the full table"""
+        mask = pd.Series(True, index=df.index)
+        for condition in self.filters:
+            column = df[condition[0]]
+            if len(condition) == 2:
+                mask &= column.notna()
+            else:
+                mask &= {
+                    '=': column.eq, '!=': column.ne, '>': column.gt,
+                    '>=': column.ge, '<': column.lt, '<=': column.le
+                }[condition[1]](condition[2]).fillna(False)
+        if self.search:
+            columns, term = self.search
+            matches = pd.Series(False, index=df.index)
+            for column in columns:
+                matches |= df[column].astype('string').str.contains(term, case=False, regex=False).fillna(False)
+            mask &= matches
+        result = df[mask]
+
+        if self.aggregates:
+            result = self._aggregate(result)
+        else:
+            result = result[list(self.output_columns())]
+        if self.distinct:
+            result = result.drop_duplicates()
+        if self.order_by:
+            result = result.sort_values(
+                [column for column, _ in self.order_by],
+                ascending=[not descending for _, descending in self.order_by],
+                na_position='last', kind='stable'
+            )
+        if self.limit is not None:
+            result = result.head(self.limit)
+        return result.reset_index(drop=True)
+
+    def apply_arrow(self, table):
+        """Evaluate the spec with Arrow compute kernels; only the result is converted to pandas"""
+        mask = None
+        for condition in self.filters:
+            column = table[condition[0]]
+            if len(condition) == 2:
+                condition_mask = pc.is_valid(column)
+            else:
+                condition_mask = pc.fill_null(ARROW_COMPARISONS[condition[1]](column, condition[2]), False)
+            mask = condition_mask if mask is None else pc.and_(mask, condition_mask)
+        if self.search:
+            columns, term = self.search
+            matches = None
+            for column in columns:
+                column_matches = pc.fill_null(
+                    pc.match_substring(pc.cast(table[column], pa.string()), term, ignore_case=True), False
+                )
+                matches = column_matches if matches is None else pc.or_(matches, column_matches)
+            mask = matches if mask is None else pc.and_(mask, matches)
+        if mask is not None:
+            table = table.filter(mask)
+
+        if self.aggregates:
+            table = self._aggregate_arrow(table)
+        else:
+            table = table.select(list(self.output_columns()))
+        if self.distinct:
+            table = table.group_by(table.column_names).aggregate([])
+        if self.order_by:
+            table = table.take(pc.sort_indices(
+                table,
+                sort_keys=[(column, 'descending' if descending else 'ascending') for column, descending in self.order_by]
+            ))
+        if self.limit is not None:
+            table = table.slice(0, self.limit)
+        return table.to_pandas()
+
+    def _aggregate_arrow(self, table):
+        if not self.group_by:
+            values = {}
+            for function, column, alias in self.aggregates:
+                if column == '*':
+                    values[alias] = [table.num_rows]
+                else:
+                    values[alias] = [getattr(pc, AGGREGATE_FUNCTIONS[function])(table[column]).as_py()]
+            return pa.table(values)
+        # COUNT(*) counts a group key including nulls, which works on every pyarrow version
+        count_all = (self.group_by[0], 'count', pc.CountOptions(mode='all'))
+        aggregations = [
+            count_all if column == '*' else (column, AGGREGATE_FUNCTIONS[function])
+            for function, column, _ in self.aggregates
+        ]
+        grouped = table.group_by(list(self.group_by)).aggregate(aggregations)
+        # Arrow names results <column>_<function>; key columns come first or last depending on the version
+        result_names = [
+            f"{self.group_by[0]}_count" if column == '*' else f"{column}_{AGGREGATE_FUNCTIONS[function]}"
+            for function, column, _ in self.aggregates
+        ]
+        return pa.table(
+            [grouped[key] for key in self.group_by] + [grouped[name] for name in result_names],
+            names=list(self.output_columns())
+        )
+
+    def _aggregate(self, df):
+        def aggregate(frame):
+            values = {}
+            for function, column, alias in self.aggregates:
+                if column == '*':
+                    values[alias] = len(frame)
+                else:
+                    values[alias] = getattr(frame[column], AGGREGATE_FUNCTIONS[function])()
+            return values
+
+        if not self.group_by:
+            return pd.DataFrame([aggregate(df)])
+        rows = [
+            dict(zip(self.group_by, key if isinstance(key, tuple) else (key,)), **aggregate(group))
+            for key, group in df.groupby(list(self.group_by), dropna=False)
+        ]
+        return pd.DataFrame(rows, columns=list(self.output_columns()))
+
+
+def escape_like(term):
+    for character in (LIKE_ESCAPE, '%', '_'):
+        term = term.replace(character, LIKE_ESCAPE + character)
+    return term
@@ -0,0 +1,161 @@
+"""N-gram search index over facility names and states for the Data Tables tab."""
+import re
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+GRAM_SIZE = 3
+# Match tiers, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+NO_MATCH = SUBSTRING + 1
+
+# Normalized text only holds [0-9a-z ]; each character becomes a base-38 digit (0 is unused),
+# so a trigram packs into a uint16 code and codes sort with numpy's radix sort
+SYMBOLS = np.zeros(256, dtype=np.uint16)
+SYMBOLS[[ord(character) for character in '0123456789abcdefghijklmnopqrstuvwxyz ']] = np.arange(1, 38)
+GRAM_CODES = 38 ** GRAM_SIZE
+
+
+def normalize(text):
+    """Lowercase and collapse punctuation to single spaces ("St. Mary's" -> "st mary s")"""
+    return re.sub(r'[^0-9a-z]+', ' ', str(text).lower()).strip() if text is not None else ''
+
+
+def normalize_array(values):
+    """normalize() for a whole Arrow string array"""
+    lowered = pc.utf8_lower(values.fill_null(''))
+    return pc.utf8_trim(pc.replace_substring_regex(lowered, pattern='[^0-9a-z]+', replacement=' '), characters=' ')
+
+
+def gram_codes(symbols, count):
+    """Code of the GRAM_SIZE characters starting at each of the first `count` positions"""
+    codes = np.zeros(count, dtype=np.uint16)
+    for offset in range(GRAM_SIZE):
+        codes = codes * 38 + symbols[offset:offset + count]
+    return codes
+
+
+class IndexedField:
+    """One searchable column, stored as its distinct normalized values plus each row's value id"""
+
+    def __init__(self, values):
+        if isinstance(values, pa.ChunkedArray):
+            values = values.combine_chunks()
+        elif not isinstance(values, pa.Array):
+            values = pa.array(values, type=pa.string())
+        encoded = normalize_array(values.cast(pa.string())).dictionary_encode()
+        self.vocabulary = encoded.dictionary
+        value_ids = encoded.indices.to_numpy(zero_copy_only=False)
+        self.offsets = np.frombuffer(
+            self.vocabulary.buffers()[1], dtype=np.int32, count=len(self.vocabulary) + 1, offset=self.vocabulary.offset * 4
+        )
+        # Normalized text is ASCII, so byte lengths are character lengths
+        self.lengths = np.diff(self.offsets)
+        # Rows grouped by value id: the rows holding value v are rows[row_starts[v]:row_starts[v + 1]]
+        self.rows = np.argsort(value_ids, kind='stable')
+        self.row_starts = np.concatenate(([0], np.cumsum(np.bincount(value_ids, minlength=len(self.vocabulary)))))
+        self.postings = None
+
+    def build_postings(self):
+        """Map each trigram code to the sorted ids of the values containing it, without a Python loop per value"""
+        if not self.lengths.sum():
+            self.postings = (np.zeros(GRAM_CODES + 1, dtype=np.int64), np.empty(0, dtype=np.int32))
+            return
+        data = np.frombuffer(self.vocabulary.buffers()[2], dtype=np.uint8)[self.offsets[0]:self.offsets[-1]]
+        symbols = SYMBOLS[data]
+        starts = max(len(symbols) - GRAM_SIZE + 1, 0)
+        # A gram may not run past the end of its value
+        valid = np.ones(starts, dtype=bool)
+        ends = self.offsets[1:] - self.offsets[0]
+        for back in range(1, GRAM_SIZE):
+            positions = ends - back
+            valid[positions[(positions >= ends - self.lengths) & (positions < starts)]] = False
+        codes = gram_codes(symbols, starts)[valid]
+        del symbols
+        # Positions are in value order, so a stable sort by code leaves each posting sorted by value id
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        owners = np.repeat(np.arange(len(self.vocabulary), dtype=np.int32), self.lengths)[:starts][valid][order]
+        del valid, order
+        distinct = np.ones(len(codes), dtype=bool)
+        distinct[1:] = (codes[1:] != codes[:-1]) | (owners[1:] != owners[:-1])
+        codes, owners = codes[distinct], owners[distinct]
+        gram_starts = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=GRAM_CODES))))
+        self.postings = (gram_starts, owners)
+
+    def candidates(self, query):
+        """Value ids that may contain the query; every value until the postings are built or for short queries"""
+        postings = self.postings
+        if postings is None or len(query) < GRAM_SIZE:
+            return np.arange(len(self.vocabulary), dtype=np.int32)
+        gram_starts, owners = postings
+        codes = gram_codes(SYMBOLS[np.frombuffer(query.encode('ascii'), dtype=np.uint8)], len(query) - GRAM_SIZE + 1)
+        lists = sorted((owners[gram_starts[code]:gram_starts[code + 1]] for code in set(codes.tolist())), key=len)
+        result = lists[0]
+        for posting in lists[1:]:
+            result = np.intersect1d(result, posting, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+    def matches(self, query):
+        """(rows, tiers, lengths) for every row whose value contains the query"""
+        value_ids = self.candidates(query)
+        values = self.vocabulary.take(pa.array(value_ids, type=pa.int32()))
+        # n-grams can co-occur without forming the query, so confirm the substring
+        tiers = np.select(
+            [
+                pc.equal(values, query).to_numpy(zero_copy_only=False),
+                pc.starts_with(values, query).to_numpy(zero_copy_only=False),
+                pc.match_substring(values, f" {query}").to_numpy(zero_copy_only=False),
+                pc.match_substring(values, query).to_numpy(zero_copy_only=False),
+            ],
+            [EXACT, PREFIX, WORD_PREFIX, SUBSTRING],
+            default=NO_MATCH
+        )
+        matched = tiers != NO_MATCH
+        value_ids, tiers = value_ids[matched], tiers[matched]
+        counts = self.row_starts[value_ids + 1] - self.row_starts[value_ids]
+        owners = np.repeat(np.arange(len(value_ids)), counts)
+        within = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = self.rows[self.row_starts[value_ids][owners] + within]
+        return rows, tiers[owners], self.lengths[value_ids][owners]
+
+
+class FacilitySearchIndex:
+    """Maps trigrams of each field's distinct normalized values to the values containing them.
+
+    A query intersects the postings of its trigrams, starting with the rarest, and only
+    those candidates are checked and ranked, so lookups cost O(matches), not O(rows).
+    The postings build on a background thread; until they are ready, and for queries
+    shorter than a trigram, searches scan the distinct values with Arrow kernels instead.
+    """
+
+    def __init__(self, *fields):
+        self.fields = [IndexedField(values) for values in fields]
+        self.row_count = len(self.fields[0].rows) if self.fields else 0
+        self.ready = threading.Event()
+        threading.Thread(target=self._build_postings, name='search-index', daemon=True).start()
+
+    def _build_postings(self):
+        for field in self.fields:
+            field.build_postings()
+        self.ready.set()
+
+    def search(self, term, limit=None):
+        """Row positions whose fields contain the term, ranked by match tier, then shorter field, then position"""
+        query = normalize(term)
+        if not query:
+            return np.arange(self.row_count)
+        matches = [field.matches(query) for field in self.fields]
+        rows, tiers, lengths = (np.concatenate(parts) for parts in zip(*matches))
+        # Keep each row's best (tier, length) across fields
+        order = np.lexsort((lengths, tiers, rows))
+        rows, tiers, lengths = rows[order], tiers[order], lengths[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        rows, tiers, lengths = rows[first], tiers[first], lengths[first]
+        positions = rows[np.lexsort((rows, lengths, tiers))].astype(np.int64)
+        return positions[:limit] if limit is not None else positions
@@ -0,0 +1,205 @@
+"""Process-wide pool of Snowflake connections shared by every dashboard session."""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+import snowflake.connector
+
+from profiling import frame_bytes, timed
+
+POOL_MAX_SIZE = 4
+# Idle connections are closed after this long so unused warehouse sessions don't linger
+POOL_IDLE_TIMEOUT_SECONDS = 600
+# Connections idle for longer than this are checked with SELECT 1 before being handed out
+HEALTH_CHECK_AFTER_SECONDS = 60
+# Distinct credential sets with a live pool per process; the least recently used pool beyond this is closed
+MAX_POOLS = 16
+
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+class SnowflakeConnectionPool:
+    """Bounded pool of connections for one set of credentials.
+
+    Connections are checked out for a single query at a time, so each query
+    gets its own cursor and concurrent sessions never share one.
+    """
+
+    def __init__(self, connect_args, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT_SECONDS,
+                 health_check_after=HEALTH_CHECK_AFTER_SECONDS):
+        self.connect_args = connect_args
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.idle = []  # (connection, returned_at), most recently used last
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.closed = False
+        self.stopped = threading.Event()
+        self.stats = {'created': 0, 'reused': 0, 'evicted': 0, 'unhealthy': 0}
+        self.reaper = threading.Thread(target=self._reap_idle, daemon=True)
+        self.reaper.start()
+
+    def _connect(self):
+        connection = snowflake.connector.connect(**self.connect_args)
+        with self.lock:
+            self.stats['created'] += 1
+        return connection
+
+    def _is_healthy(self, connection):
+        if connection.is_closed():
+            return False
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+            return True
+        except snowflake.connector.Error:
+            return False
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except snowflake.connector.Error:
+            pass
+
+    def _checkout(self):
+        self.evict_idle()
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                connection, returned_at = self.idle.pop()
+            if time.monotonic() - returned_at < self.health_check_after or self._is_healthy(connection):
+                with self.lock:
+                    self.stats['reused'] += 1
+                return connection
+            with self.lock:
+                self.stats['unhealthy'] += 1
+            self._close(connection)
+        return self._connect()
+
+    @contextmanager
+    def connection(self):
+        """Check out a healthy connection; it is discarded instead of returned if it fails mid-use"""
+        if self.closed:
+            raise RuntimeError("Connection pool is closed")
+        self.slots.acquire()
+        connection = None
+        try:
+            connection = self._checkout()
+            yield connection
+        except (snowflake.connector.errors.OperationalError, snowflake.connector.errors.InterfaceError):
+            # Lost or broken connections are dropped; SQL errors leave the connection usable
+            if connection is not None:
+                self._close(connection)
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                if self.closed or connection.is_closed():
+                    self._close(connection)
+                else:
+                    with self.lock:
+                        self.idle.append((connection, time.monotonic()))
+            self.slots.release()
+
+    @contextmanager
+    def cursor(self):
+        """A fresh cursor on a pooled connection, closed after the query"""
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def evict_idle(self):
+        """Close connections that have been idle longer than idle_timeout"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self.lock:
+            expired = [connection for connection, returned_at in self.idle if returned_at < cutoff]
+            self.idle = [(connection, returned_at) for connection, returned_at in self.idle if returned_at >= cutoff]
+            self.stats['evicted'] += len(expired)
+        for connection in expired:
+            self._close(connection)
+
+    def _reap_idle(self):
+        while not self.stopped.wait(max(self.idle_timeout / 2, 1)):
+            self.evict_idle()
+
+    def close_all(self):
+        """Close idle connections and stop the reaper; checked-out connections are closed when returned"""
+        self.closed = True
+        self.stopped.set()
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+
+def shared_pool(connect_args, max_pools=MAX_POOLS):
+    """The process-wide pool for one set of credentials, created on first use.
+
+    Pools are kept in least-recently-used order; one pushed out by a new
+    credential set is closed, so its sessions and reaper thread don't leak.
+    """
+    key = tuple(sorted(connect_args.items()))
+    evicted = []
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = _pools[key] = SnowflakeConnectionPool(connect_args)
+        _pools.move_to_end(key)
+        while len(_pools) > max_pools:
+            evicted.append(_pools.popitem(last=False)[1])
+    for old_pool in evicted:
+        old_pool.close_all()
+    return pool
+
+
+def close_pools():
+    """Close and forget every shared pool (e.g. before pointing the dashboard at another warehouse)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def run_query(pool, query, params=None):
+    """Run a query on its own cursor from the pool and return the result as a DataFrame"""
+    with pool.cursor() as cursor:
+        with timed('query', ' '.join(query.split())[:120]):
+            cursor.execute(query, params)
+        # Arrow result batches -> pandas conversion, timed separately from the query itself
+        with timed('fetch', 'fetch_pandas_all') as event:
+            df = cursor.fetch_pandas_all()
+            event.update(rows=len(df), bytes=frame_bytes(df))
+        return df
+
+
+def run_query_batches(pool, query, params=None, max_rows=None):
+    """Like run_query, but converts the result one Arrow batch at a time and stops reading after max_rows"""
+    frames = []
+    row_count = 0
+    with pool.cursor() as cursor:
+        with timed('query', ' '.join(query.split())[:120]):
+            cursor.execute(query, params)
+        with timed('fetch', 'fetch_pandas_batches') as event:
+            for batch in cursor.fetch_pandas_batches():
+                frames.append(batch)
+                row_count += len(batch)
+                if max_rows is not None and row_count >= max_rows:
+                    break
+            columns = [column[0] for column in cursor.description]
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+            if max_rows is not None:
+                df = df.head(max_rows)
+            event.update(rows=len(df), batches=len(frames), bytes=frame_bytes(df))
+    return df
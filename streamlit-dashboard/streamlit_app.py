@@ -1,9 +1,18 @@
 import streamlit as st
-import snowflake.connector
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import date
+import logging
+import os
+import time
+import profiling
+from datetime import date, timedelta
+from charts import SVG_POINT_LIMIT, WEBGL_POINT_LIMIT, binned_histogram, density_heatmap
+from drilldown import GRANULARITIES, TrendSlice, date_bounds_sql
+from local_replica import LocalReplica, read_table
+from query_builder import QuerySpec
+from search_index import FacilitySearchIndex
+from snowflake_pool import run_query, run_query_batches, shared_pool
 
 # Page configuration
 st.set_page_config(
@@ -12,42 +21,596 @@ st.set_page_config(
     layout="wide"
 )
 
+# A full script run starts a new profiling record (only while the debug panel is on)
+if profiling.current() is not None:
+    profiling.current().start_run()
+
 st.title("🏥 Healthcare Analytics Dashboard")
 st.markdown("### Real-time Nursing Staffing & Performance Insights")
 
+logger = logging.getLogger(__name__)
+
+def get_connection_pool(acct, usr, pwd, role, wh, db, schema):
+    # One pool per set of credentials, shared by every session in this process
+    return shared_pool({
+        'user': usr,
+        'password': pwd,
+        'account': acct,
+        'role': role,
+        'warehouse': wh,
+        'database': db,
+        'schema': schema
+    })
+
 def connect_to_snowflake(acct, usr, pwd, role, wh, db, schema):
     try:
-        ctx = snowflake.connector.connect(  
-            user=usr,
-            password=pwd,
-            account=acct,
-            role=role,
-            warehouse=wh,
-            database=db,
-            schema=schema  
-        )
-        cs = ctx.cursor()
-        st.session_state['snow_conn'] = cs
+        pool = get_connection_pool(acct, usr, pwd, role, wh, db, schema)
+        # Open (or health-check) one connection up front so bad credentials fail here
+        with pool.connection():
+            pass
+        st.session_state['snow_pool'] = pool
+        st.session_state['snow_target'] = (acct, usr, role, wh, db, schema)
         st.session_state['is_ready'] = True
-        return cs
+        return pool
     except Exception as e:
         st.error(f"Connection failed: {str(e)}")
         st.session_state['is_ready'] = False
         return None
 
-@st.cache_data(ttl=600)
-def get_facility_data():
-    query = 'SELECT * FROM GOLD_FACILITY_PERFORMANCE_SUMMARY;'
-    results = st.session_state['snow_conn'].execute(query)
-    results = st.session_state['snow_conn'].fetch_pandas_all()
-    return results
+# Gold tables the dashboard reads; their last-altered time is the data version
+DATA_VERSION_TABLES = ('GOLD_FACILITY_PERFORMANCE_SUMMARY', 'GOLD_STATE_BENCHMARKS')
+# How often the (metadata-only) version probe runs; results are cached until the version changes
+VERSION_PROBE_TTL_SECONDS = 60
+QUERY_CACHE_MAX_ENTRIES = 64
+DERIVED_CACHE_MAX_ENTRIES = 256
+FACILITY_TABLE = 'GOLD_FACILITY_PERFORMANCE_SUMMARY'
+STATE_TABLE = 'GOLD_STATE_BENCHMARKS'
+# Tables up to this size are fetched whole once per data version and filtered in pandas;
+# larger ones get each widget's filters, sort and limit pushed down to Snowflake
+FULL_TABLE_MAX_ROWS = 50000
+TABLE_ROW_LIMIT = 10000
+TREND_CACHE_MAX_ENTRIES = 128
+# A day-level slice has one row per day in the window; this only guards against runaway results
+TREND_MAX_ROWS = 5000
+DEFAULT_TREND_WINDOW_DAYS = 90
+# Serve queries from the memory-mapped local replica of the gold tables instead of querying Snowflake
+USE_LOCAL_REPLICA = os.environ.get('DASHBOARD_LOCAL_REPLICA', 'true').lower() == 'true'
+# Browsing the replica offline skips the Snowflake login, so it is only offered where the host opts in
+ALLOW_OFFLINE_REPLICA = os.environ.get('DASHBOARD_ALLOW_OFFLINE', 'false').lower() == 'true'
+
+# Pools are excluded from cache keys (leading underscore); the target keeps accounts and databases apart
+@st.cache_data(ttl=VERSION_PROBE_TTL_SECONDS, show_spinner=False)
+def get_table_versions(_pool, target):
+    profiling.note_cache_miss()
+    placeholders = ', '.join(['%s'] * len(DATA_VERSION_TABLES))
+    query = f"""
+        SELECT TABLE_NAME, TO_VARCHAR(LAST_ALTERED, 'YYYY-MM-DD HH24:MI:SS.FF3 TZH:TZM')
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = CURRENT_SCHEMA() AND TABLE_NAME IN ({placeholders})
+    """
+    versions = {}
+    try:
+        with _pool.cursor() as cursor:
+            cursor.execute(query, DATA_VERSION_TABLES)
+            versions = dict(cursor.fetchall())
+    except Exception as e:
+        logger.warning("Data version probe failed, falling back to a 10 minute refresh: %s", e)
+    # Without metadata access, fall back to refreshing every 10 minutes
+    fallback = f"ttl-{int(time.time() // 600)}"
+    return {table: versions.get(table) or fallback for table in DATA_VERSION_TABLES}
+
+@st.cache_resource(show_spinner=False)
+def get_replica(target):
+    return LocalReplica(target)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def open_replica_table(path):
+    profiling.note_cache_miss()
+    # Each replica file name is unique per version; one memory map per process serves every session
+    return read_table(path)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_search_index(path):
+    profiling.note_cache_miss()
+    # Built once per replica file, i.e. once per data version, and shared by every session.
+    # Searches scan the names until the n-gram postings finish building in the background
+    table = open_replica_table(path)
+    return FacilitySearchIndex(table['FACILITY_NAME'], table['STATE'])
+
+def current_table_versions():
+    pool = st.session_state['snow_pool']
+    target = st.session_state['snow_target']
+    if pool is None:
+        # Offline: the replica's own versions are current by definition
+        return get_replica(target).versions()
+    return profiling.cache_call('table_versions', get_table_versions, pool, target)
+
+def get_data_version():
+    return max(current_table_versions().values(), default='unknown')
+
+def sync_replica():
+    """Re-fetch replica tables whose upstream version changed (a no-op while offline)"""
+    if USE_LOCAL_REPLICA and st.session_state['snow_pool'] is not None:
+        get_replica(st.session_state['snow_target']).refresh(st.session_state['snow_pool'], current_table_versions())
+
+def open_local_replica(acct, usr, role, wh, db, schema):
+    if not (USE_LOCAL_REPLICA and ALLOW_OFFLINE_REPLICA):
+        st.error("Offline mode is disabled on this server.")
+        return
+    target = (acct, usr, role, wh, db, schema)
+    if get_replica(target).is_available():
+        st.session_state['snow_pool'] = None
+        st.session_state['snow_target'] = target
+        st.session_state['is_ready'] = True
+    else:
+        st.error("No local replica for these connection settings yet - connect to Snowflake once to create it.")
+
+@st.cache_data(max_entries=QUERY_CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_query(_pool, target, data_version, query, params=None):
+    profiling.note_cache_miss()
+    return run_query(_pool, query, params)
+
+# Silver and gold are rebuilt by the same dbt run, so the gold data version also keys silver slices
+@st.cache_data(max_entries=TREND_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_trend_slice(_pool, target, data_version, trend_slice):
+    profiling.note_cache_miss()
+    return run_query_batches(_pool, *trend_slice.to_sql(), max_rows=TREND_MAX_ROWS)
+
+def get_table_row_count(pool, target, data_version, table):
+    count_sql, params = QuerySpec(table, aggregates=(('COUNT', '*', 'ROW_COUNT'),)).to_sql()
+    return int(profiling.cache_call('query', cached_query, pool, target, data_version, count_sql, params).iloc[0, 0])
+
+def fetch(spec):
+    pool = st.session_state['snow_pool']
+    target = st.session_state['snow_target']
+    if USE_LOCAL_REPLICA:
+        table = profiling.cache_call('replica_table', open_replica_table, get_replica(target).table_path(spec.table))
+        with profiling.timed('transform', spec.table, engine='arrow') as event:
+            result = spec.apply_arrow(table)
+            event['rows'] = len(result)
+        return result
+    data_version = get_data_version()
+    if get_table_row_count(pool, target, data_version, spec.table) <= FULL_TABLE_MAX_ROWS:
+        full_table = profiling.cache_call('query', cached_query, pool, target, data_version, *QuerySpec(spec.table).to_sql())
+        with profiling.timed('transform', spec.table, engine='pandas') as event:
+            result = spec.apply(full_table)
+            event['rows'] = len(result)
+        return result
+    return profiling.cache_call('query', cached_query, pool, target, data_version, *spec.to_sql())
+
+def plot(fig, name):
+    with profiling.timed('figure', name) as event:
+        payload_bytes = profiling.figure_payload_bytes(fig)
+        if payload_bytes is not None:
+            event['bytes'] = payload_bytes
+        st.plotly_chart(fig, use_container_width=True)
+
+def render_profiling_panel():
+    profiler = profiling.current()
+    if profiler is None or not profiler.runs:
+        return
+    run = profiler.runs[-1]
+    with st.sidebar.expander(f"⏱️ Performance - run {run['run']}", expanded=True):
+        st.caption("Totals by kind (fragment reruns add to the latest run)")
+        st.dataframe(pd.DataFrame.from_dict(profiler.summary(), orient='index').fillna(0), use_container_width=True)
+        st.dataframe(pd.DataFrame(run['events']), use_container_width=True, height=300)
+        st.download_button(
+            "📥 Export JSON",
+            profiler.to_json(),
+            file_name=f"dashboard-profile-{run['started_at'][:19].replace(':', '')}.json",
+            mime="application/json"
+        )
+
+@st.cache_data(max_entries=DERIVED_CACHE_MAX_ENTRIES, show_spinner=False)
+def memoized_fetch(target, data_version, spec):
+    profiling.note_cache_miss()
+    return fetch(spec)
+
+def derived(spec):
+    # Small derived frames (aggregates, top-N, lists) are memoized on the data version and the spec,
+    # which carries the widget values that shape them
+    return profiling.cache_call('derived', memoized_fetch, st.session_state['snow_target'], get_data_version(), spec)
+
+@st.fragment
+@profiling.profiled('section', 'Facility Performance')
+def facility_performance_section():
+    st.markdown("## 🏥 Facility Performance Rankings")
+    
+    # State filter
+    states = ['All States'] + derived(QuerySpec(
+        FACILITY_TABLE, columns=('STATE',), filters=(('STATE', 'NOT NULL'),),
+        distinct=True, order_by=(('STATE', False),)
+    ))['STATE'].tolist()
+    selected_state = st.selectbox("Filter by State:", states, key="facility_state_filter")
+    
+    # Filter data
+    if selected_state != 'All States':
+        ranking_filters = (('STATE', '=', selected_state), ('AVG_HOURS_PER_PATIENT', 'NOT NULL'))
+    else:
+        ranking_filters = (('AVG_HOURS_PER_PATIENT', 'NOT NULL'),)
+    
+    # Performance analysis
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("### 🟢 Most Efficient Facilities")
+        st.caption("Lowest nursing hours per patient")
+    
+        top_performers = derived(QuerySpec(
+            FACILITY_TABLE, columns=('FACILITY_NAME', 'AVG_HOURS_PER_PATIENT'), filters=ranking_filters,
+            order_by=(('AVG_HOURS_PER_PATIENT', False),), limit=10
+        ))
+    
+        if len(top_performers) > 0:
+            fig_top = px.bar(
+                top_performers,
+                x='AVG_HOURS_PER_PATIENT',
+                y='FACILITY_NAME',
+                orientation='h',
+                color='AVG_HOURS_PER_PATIENT',
+                color_continuous_scale='Greens_r',
+                title="Top 10 Most Efficient Facilities"
+            )
+            fig_top.update_layout(
+                height=400, 
+                showlegend=False,
+                yaxis_title="",
+                xaxis_title="Hours per Patient"
+            )
+            plot(fig_top, 'top')
+        else:
+            st.info("No data available for selected state")
+    
+    with col2:
+        st.markdown("### 🔴 Least Efficient Facilities")
+        st.caption("Highest nursing hours per patient")
+    
+        bottom_performers = derived(QuerySpec(
+            FACILITY_TABLE, columns=('FACILITY_NAME', 'AVG_HOURS_PER_PATIENT'), filters=ranking_filters,
+            order_by=(('AVG_HOURS_PER_PATIENT', True),), limit=10
+        ))
+    
+        if len(bottom_performers) > 0:
+            fig_bottom = px.bar(
+                bottom_performers,
+                x='AVG_HOURS_PER_PATIENT',
+                y='FACILITY_NAME',
+                orientation='h',
+                color='AVG_HOURS_PER_PATIENT',
+                color_continuous_scale='Reds',
+                title="Top 10 Least Efficient Facilities"
+            )
+            fig_bottom.update_layout(
+                height=400, 
+                showlegend=False,
+                yaxis_title="",
+                xaxis_title="Hours per Patient"
+            )
+            plot(fig_bottom, 'bottom')
+        else:
+            st.info("No data available for selected state")
+
+@st.fragment
+@profiling.profiled('section', 'State Analysis')
+def state_analysis_section(state_df):
+    st.markdown("## 🗺️ State-Level Healthcare Performance")
+    
+    # State comparison chart
+    fig_states = px.bar(
+        state_df.sort_values('STATE_AVG_HOURS_PER_PATIENT'),
+        x='STATE',
+        y='STATE_AVG_HOURS_PER_PATIENT',
+        color='STATE_AVG_HOURS_PER_PATIENT',
+        color_continuous_scale='RdYlBu_r',
+        title="Average Nursing Hours per Patient by State",
+        labels={
+            'STATE_AVG_HOURS_PER_PATIENT': 'Hours per Patient',
+            'STATE': 'State'
+        }
+    )
+    fig_states.update_layout(height=500, showlegend=False)
+    plot(fig_states, 'states')
+    
+    # State performance metrics
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        best_state = state_df.loc[state_df['STATE_AVG_HOURS_PER_PATIENT'].idxmin()]
+        st.success(f"**🥇 Most Efficient State**\n\n{best_state['STATE']}\n\n{best_state['STATE_AVG_HOURS_PER_PATIENT']:.2f} hours/patient")
+    
+    with col2:
+        worst_state = state_df.loc[state_df['STATE_AVG_HOURS_PER_PATIENT'].idxmax()]
+        st.error(f"**📈 Least Efficient State**\n\n{worst_state['STATE']}\n\n{worst_state['STATE_AVG_HOURS_PER_PATIENT']:.2f} hours/patient")
+    
+    with col3:
+        efficiency_gap = worst_state['STATE_AVG_HOURS_PER_PATIENT'] - best_state['STATE_AVG_HOURS_PER_PATIENT']
+        st.info(f"**📊 Efficiency Gap**\n\n{efficiency_gap:.2f} hours/patient\n\nDifference between best and worst performing states")
+
+@st.fragment
+@profiling.profiled('section', 'Staffing Analysis')
+def staffing_analysis_section(total_facilities):
+    st.markdown("## 📊 Staffing Analysis")
+    
+    # Contract vs efficiency analysis
+    st.markdown("### Contract Staffing vs Efficiency")
+    
+    scatter_labels = {
+        'AVG_CONTRACT_PERCENTAGE': 'Contract Staff Percentage (%)',
+        'AVG_HOURS_PER_PATIENT': 'Hours per Patient',
+        'AVG_PATIENT_CENSUS': 'Patient Census'
+    }
+    scatter_title = "Relationship between Contract Staffing and Efficiency"
+    scatter_columns = (
+        'FACILITY_NAME', 'STATE', 'AVG_CONTRACT_PERCENTAGE', 'AVG_HOURS_PER_PATIENT', 'AVG_PATIENT_CENSUS'
+    )
+    
+    if total_facilities <= SVG_POINT_LIMIT:
+        fig_scatter = px.scatter(
+            fetch(QuerySpec(FACILITY_TABLE, columns=scatter_columns)),
+            x='AVG_CONTRACT_PERCENTAGE',
+            y='AVG_HOURS_PER_PATIENT',
+            color='STATE',
+            size='AVG_PATIENT_CENSUS',
+            hover_data=['FACILITY_NAME'],
+            title=scatter_title,
+            labels=scatter_labels
+        )
+    else:
+        # Large-data mode: the sliders act as zoom; points are drawn individually (WebGL)
+        # once the window holds few enough of them, otherwise as a server-side density grid
+        bounds = derived(QuerySpec(FACILITY_TABLE, aggregates=(
+            ('MIN', 'AVG_CONTRACT_PERCENTAGE', 'X_MIN'), ('MAX', 'AVG_CONTRACT_PERCENTAGE', 'X_MAX'),
+            ('MIN', 'AVG_HOURS_PER_PATIENT', 'Y_MIN'), ('MAX', 'AVG_HOURS_PER_PATIENT', 'Y_MAX')
+        ))).iloc[0]
+        zoom_col1, zoom_col2 = st.columns(2)
+        with zoom_col1:
+            x_range = st.slider(
+                "Contract Staff % range:", float(bounds['X_MIN']), float(bounds['X_MAX']) + 0.1,
+                (float(bounds['X_MIN']), float(bounds['X_MAX']) + 0.1), key="scatter_x_range"
+            )
+        with zoom_col2:
+            y_range = st.slider(
+                "Hours per Patient range:", float(bounds['Y_MIN']), float(bounds['Y_MAX']) + 0.01,
+                (float(bounds['Y_MIN']), float(bounds['Y_MAX']) + 0.01), key="scatter_y_range"
+            )
+        window_filters = (
+            ('AVG_CONTRACT_PERCENTAGE', '>=', x_range[0]), ('AVG_CONTRACT_PERCENTAGE', '<=', x_range[1]),
+            ('AVG_HOURS_PER_PATIENT', '>=', y_range[0]), ('AVG_HOURS_PER_PATIENT', '<=', y_range[1])
+        )
+        points_in_window = int(derived(QuerySpec(
+            FACILITY_TABLE, filters=window_filters, aggregates=(('COUNT', '*', 'POINTS'),)
+        )).iloc[0, 0])
+    
+        if points_in_window <= WEBGL_POINT_LIMIT:
+            fig_scatter = px.scatter(
+                fetch(QuerySpec(FACILITY_TABLE, columns=scatter_columns, filters=window_filters)),
+                x='AVG_CONTRACT_PERCENTAGE',
+                y='AVG_HOURS_PER_PATIENT',
+                color='STATE',
+                size='AVG_PATIENT_CENSUS',
+                hover_data=['FACILITY_NAME'],
+                title=scatter_title,
+                labels=scatter_labels,
+                render_mode='webgl'
+            )
+        else:
+            window = fetch(QuerySpec(
+                FACILITY_TABLE, columns=('AVG_CONTRACT_PERCENTAGE', 'AVG_HOURS_PER_PATIENT'), filters=window_filters
+            ))
+            fig_scatter = density_heatmap(
+                window['AVG_CONTRACT_PERCENTAGE'], window['AVG_HOURS_PER_PATIENT'], x_range, y_range,
+                scatter_title, scatter_labels['AVG_CONTRACT_PERCENTAGE'], scatter_labels['AVG_HOURS_PER_PATIENT']
+            )
+            st.caption(f"{points_in_window:,} facilities in view, shown as density. Narrow the ranges to "
+                       f"{WEBGL_POINT_LIMIT:,} or fewer to hover over individual facilities.")
+    fig_scatter.update_layout(height=500)
+    plot(fig_scatter, 'scatter')
+    
+    # RN percentage distribution
+    st.markdown("### RN Staffing Distribution")
+    
+    rn_df = fetch(QuerySpec(FACILITY_TABLE, columns=('AVG_RN_PERCENTAGE',)))
+    rn_title = "Distribution of RN Staffing Percentage Across Facilities"
+    if len(rn_df) <= SVG_POINT_LIMIT:
+        fig_rn = px.histogram(
+            rn_df,
+            x='AVG_RN_PERCENTAGE',
+            nbins=25,
+            title=rn_title,
+            labels={
+                'AVG_RN_PERCENTAGE': 'RN Percentage (%)',
+                'count': 'Number of Facilities'
+            }
+        )
+    else:
+        # Counted here so the browser receives 25 bars instead of every row
+        fig_rn = binned_histogram(rn_df['AVG_RN_PERCENTAGE'], 25, rn_title, 'RN Percentage (%)')
+    fig_rn.update_layout(height=400)
+    plot(fig_rn, 'rn')
+    
+    # Insights section
+    st.markdown("### 🔍 Key Insights")
+    
+    # Contract staffing analysis
+    contract_aggregates = (('AVG', 'AVG_HOURS_PER_PATIENT', 'AVG_HOURS'), ('COUNT', '*', 'FACILITIES'))
+    high_contract = derived(QuerySpec(
+        FACILITY_TABLE, filters=(('AVG_CONTRACT_PERCENTAGE', '>', 30),), aggregates=contract_aggregates
+    )).iloc[0]
+    low_contract = derived(QuerySpec(
+        FACILITY_TABLE, filters=(('AVG_CONTRACT_PERCENTAGE', '<=', 30),), aggregates=contract_aggregates
+    )).iloc[0]
+    
+    if high_contract['FACILITIES'] > 0 and low_contract['FACILITIES'] > 0:
+        high_avg = high_contract['AVG_HOURS']
+        low_avg = low_contract['AVG_HOURS']
+    
+        col1, col2 = st.columns(2)
+    
+        with col1:
+            st.metric(
+                label="High Contract Facilities (>30%)",
+                value=f"{high_avg:.2f} hrs/patient",
+                help=f"Average efficiency for {int(high_contract['FACILITIES'])} facilities with >30% contract staff"
+            )
+    
+        with col2:
+            st.metric(
+                label="Low Contract Facilities (≤30%)",
+                value=f"{low_avg:.2f} hrs/patient",
+                delta=f"{low_avg - high_avg:.2f}",
+                help=f"Average efficiency for {int(low_contract['FACILITIES'])} facilities with ≤30% contract staff"
+            )
+    
+        if high_avg > low_avg:
+            st.warning(f"💡 **Insight**: Facilities with higher contract staff usage show {high_avg - low_avg:.2f} more hours per patient on average, suggesting potential efficiency challenges with contract staffing.")
+        else:
+            st.success(f"💡 **Insight**: Facilities with higher contract staff usage are {low_avg - high_avg:.2f} hours more efficient per patient, indicating effective contract staff utilization.")
+
+@st.fragment
+@profiling.profiled('section', 'Data Tables')
+def data_tables_section(total_facilities, state_df):
+    st.markdown("## 📋 Data Tables")
+    
+    # Facility data table
+    st.markdown("### Facility Performance Data")
+    st.caption(f"Complete data for {total_facilities} healthcare facilities")
+    
+    # Add search functionality
+    search_term = st.text_input("🔍 Search facilities:", placeholder="Enter facility name or state...")
+    
+    search = (('FACILITY_NAME', 'STATE'), search_term) if search_term else ()
+    # The replica has an n-gram index, which also ranks matches by quality
+    use_search_index = USE_LOCAL_REPLICA and bool(search_term)
+    
+    # Sort options
+    sort_options = ['AVG_HOURS_PER_PATIENT', 'AVG_CONTRACT_PERCENTAGE', 'AVG_PATIENT_CENSUS', 'FACILITY_NAME']
+    if use_search_index:
+        sort_options = ['Best Match'] + sort_options
+    sort_column = st.selectbox(
+        "Sort by:",
+        sort_options,
+        key="sort_option"
+    )
+    
+    sort_order = st.radio("Sort order:", ['Ascending', 'Descending'], horizontal=True)
+    order_by = () if sort_column == 'Best Match' else ((sort_column, sort_order == 'Descending'),)
+    
+    match_count = None
+    if use_search_index:
+        facility_path = get_replica(st.session_state['snow_target']).table_path(FACILITY_TABLE)
+        search_index = profiling.cache_call('search_index', get_search_index, facility_path)
+        with profiling.timed('transform', 'search', engine='index' if search_index.ready.is_set() else 'scan') as event:
+            positions = search_index.search(search_term)
+            event['rows'] = len(positions)
+        match_count = len(positions)
+        filtered_table = QuerySpec(FACILITY_TABLE, order_by=order_by, limit=TABLE_ROW_LIMIT).apply_arrow(
+            open_replica_table(facility_path).take(positions)
+        )
+    else:
+        filtered_table = fetch(QuerySpec(FACILITY_TABLE, search=search, order_by=order_by, limit=TABLE_ROW_LIMIT))
+    
+    st.dataframe(filtered_table, use_container_width=True, height=400)
+    if len(filtered_table) == TABLE_ROW_LIMIT:
+        if match_count is None:
+            match_count = int(derived(QuerySpec(
+                FACILITY_TABLE, search=search, aggregates=(('COUNT', '*', 'MATCHES'),)
+            )).iloc[0, 0])
+        st.caption(f"Showing the first {TABLE_ROW_LIMIT:,} of {match_count:,} matching facilities")
+    
+    # State benchmarks table
+    st.markdown("### State Benchmark Data")
+    st.caption(f"Comparative performance across {len(state_df)} states")
+    
+    state_table = state_df.sort_values('STATE_AVG_HOURS_PER_PATIENT')
+    st.dataframe(state_table, use_container_width=True)
 
-@st.cache_data(ttl=600)
-def get_state_data():
-    query = 'SELECT * FROM GOLD_STATE_BENCHMARKS;'
-    results = st.session_state['snow_conn'].execute(query)
-    results = st.session_state['snow_conn'].fetch_pandas_all()
-    return results
+@st.fragment
+@profiling.profiled('section', 'Trend Drill-down')
+def trend_drilldown_section(state_df):
+    st.markdown("## 🔎 Daily Trend Drill-down")
+    
+    pool = st.session_state['snow_pool']
+    if pool is None:
+        st.info("The drill-down reads the daily silver trends from Snowflake - connect to use it.")
+        return
+    target = st.session_state['snow_target']
+    data_version = get_data_version()
+    
+    try:
+        bounds = profiling.cache_call('query', cached_query, pool, target, data_version, date_bounds_sql()).iloc[0]
+    except Exception as e:
+        # e.g. the role can read GOLD but has no grant on SILVER
+        st.error(f"Could not read the daily trends: {str(e)}")
+        return
+    if pd.isna(bounds['LAST_DATE']):
+        st.info("No daily trend data available")
+        return
+    first_date = pd.Timestamp(bounds['FIRST_DATE']).date()
+    last_date = pd.Timestamp(bounds['LAST_DATE']).date()
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        state = st.selectbox("State:", sorted(state_df['STATE'].dropna()), key="drilldown_state")
+    
+    with col2:
+        facilities = ['All Facilities'] + derived(QuerySpec(
+            FACILITY_TABLE, columns=('FACILITY_NAME',), filters=(('STATE', '=', state),),
+            distinct=True, order_by=(('FACILITY_NAME', False),)
+        ))['FACILITY_NAME'].tolist()
+        facility = st.selectbox("Facility:", facilities, key="drilldown_facility")
+    
+    with col3:
+        granularity = st.radio("Granularity:", list(GRANULARITIES), index=1, horizontal=True, key="drilldown_granularity")
+    
+    window = st.date_input(
+        "Date range:",
+        value=(max(first_date, last_date - timedelta(days=DEFAULT_TREND_WINDOW_DAYS)), last_date),
+        min_value=first_date,
+        max_value=last_date,
+        key="drilldown_window"
+    )
+    if len(window) != 2:
+        st.caption("Pick an end date to load the trend")
+        return
+    
+    # Snowflake aggregates to the chosen buckets; each (selection, window, granularity) slice is cached
+    trend_slice = TrendSlice(state, None if facility == 'All Facilities' else facility, granularity, *window)
+    trend = profiling.cache_call('trend', get_trend_slice, pool, target, data_version, trend_slice)
+    if trend.empty:
+        st.info("No daily data for this selection")
+        return
+    
+    subject = state if trend_slice.facility is None else f"{facility} ({state})"
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig_trend_hours = px.line(
+            trend,
+            x='PERIOD_START',
+            y='HOURS_PER_PATIENT_DAY',
+            markers=len(trend) <= 60,
+            title=f"Nursing Hours per Patient Day - {subject}",
+            labels={'PERIOD_START': granularity, 'HOURS_PER_PATIENT_DAY': 'Hours per Patient Day'}
+        )
+        fig_trend_hours.update_layout(height=400)
+        plot(fig_trend_hours, 'trend_hours')
+    
+    with col2:
+        fig_trend_census = px.line(
+            trend,
+            x='PERIOD_START',
+            y='AVG_DAILY_CENSUS',
+            markers=len(trend) <= 60,
+            title=f"Average Daily Patient Census - {subject}",
+            labels={'PERIOD_START': granularity, 'AVG_DAILY_CENSUS': 'Patients per Day'}
+        )
+        fig_trend_census.update_layout(height=400)
+        plot(fig_trend_census, 'trend_census')
+    
+    st.caption(f"{len(trend):,} {granularity.lower()} buckets from {window[0]} to {window[1]}, "
+               f"covering up to {int(trend['FACILITIES'].max()):,} facilities")
+    st.dataframe(trend, use_container_width=True, height=300)
 
 # Sidebar for connection
 st.sidebar.header("🔗 Snowflake Connection")
@@ -67,29 +630,53 @@ with st.sidebar:
         on_click=connect_to_snowflake,
         args=(account, username, password, role, warehouse, database, schema)
     )
+    if USE_LOCAL_REPLICA and ALLOW_OFFLINE_REPLICA:
+        st.button(
+            "📂 Open Local Replica (offline)",
+            on_click=open_local_replica,
+            args=(account, username, role, warehouse, database, schema)
+        )
+    st.checkbox("🛠️ Performance debug panel", key="debug_profiling")
 
 # Initialize connection state
 if 'is_ready' not in st.session_state:
     st.session_state['is_ready'] = False
 
+# A pool closed to make room for other credentials can't serve this session any more
+if st.session_state['is_ready'] and st.session_state['snow_pool'] is not None and st.session_state['snow_pool'].closed:
+    st.session_state['is_ready'] = False
+    st.sidebar.warning("Connection closed after being idle - please reconnect.")
+
 # Main dashboard content
 if st.session_state['is_ready']:
-    st.sidebar.success("✅ Connected!")
+    if st.session_state['snow_pool'] is None:
+        st.sidebar.info("📂 Offline - serving the local replica")
+    else:
+        st.sidebar.success("✅ Connected!")
     
     try:
+        sync_replica()
+        st.sidebar.caption(f"Gold data version: {get_data_version()}")
+        
         # Load data
-        facility_df = get_facility_data()
-        state_df = get_state_data()
+        kpis = derived(QuerySpec(FACILITY_TABLE, aggregates=(
+            ('AVG', 'AVG_HOURS_PER_PATIENT', 'AVG_HOURS_PER_PATIENT'),
+            ('COUNT', '*', 'FACILITIES'),
+            ('AVG', 'AVG_CONTRACT_PERCENTAGE', 'AVG_CONTRACT_PERCENTAGE'),
+            ('AVG', 'AVG_PATIENT_CENSUS', 'AVG_PATIENT_CENSUS')
+        ))).iloc[0]
+        state_df = derived(QuerySpec(STATE_TABLE))
+        total_facilities = int(kpis['FACILITIES'])
         
         # Success message with data summary
-        st.success(f"📊 Loaded {len(facility_df)} facilities across {len(state_df)} states")
+        st.success(f"📊 Loaded {total_facilities} facilities across {len(state_df)} states")
         
         # Key Performance Indicators
         st.markdown("## 📈 Key Performance Indicators")
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            avg_hours = facility_df['AVG_HOURS_PER_PATIENT'].mean()
+            avg_hours = kpis['AVG_HOURS_PER_PATIENT']
             st.metric(
                 label="Avg Hours/Patient",
                 value=f"{avg_hours:.2f}",
@@ -97,7 +684,6 @@ if st.session_state['is_ready']:
             )
         
         with col2:
-            total_facilities = len(facility_df)
             st.metric(
                 label="Total Facilities",
                 value=f"{total_facilities:,}",
@@ -105,7 +691,7 @@ if st.session_state['is_ready']:
             )
             
         with col3:
-            avg_contract = facility_df['AVG_CONTRACT_PERCENTAGE'].mean()
+            avg_contract = kpis['AVG_CONTRACT_PERCENTAGE']
             st.metric(
                 label="Avg Contract Staff %",
                 value=f"{avg_contract:.1f}%",
@@ -113,235 +699,25 @@ if st.session_state['is_ready']:
             )
             
         with col4:
-            avg_census = facility_df['AVG_PATIENT_CENSUS'].mean()
+            avg_census = kpis['AVG_PATIENT_CENSUS']
             st.metric(
                 label="Avg Patient Census",
                 value=f"{avg_census:.0f}",
                 help="Average number of patients per facility"
             )
         
-        # Create tabs for different analyses
-        tab1, tab2, tab3, tab4 = st.tabs([
-            "🏥 Facility Performance", 
-            "🗺️ State Analysis", 
-            "📊 Staffing Analysis",
-            "📋 Data Tables"
-        ])
-        
-        with tab1:
-            st.markdown("## 🏥 Facility Performance Rankings")
-            
-            # State filter
-            states = ['All States'] + sorted(facility_df['STATE'].unique().tolist())
-            selected_state = st.selectbox("Filter by State:", states, key="facility_state_filter")
-            
-            # Filter data
-            if selected_state != 'All States':
-                filtered_df = facility_df[facility_df['STATE'] == selected_state]
-            else:
-                filtered_df = facility_df
-            
-            # Performance analysis
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("### 🟢 Most Efficient Facilities")
-                st.caption("Lowest nursing hours per patient")
-                
-                top_performers = filtered_df.nsmallest(10, 'AVG_HOURS_PER_PATIENT')
-                
-                if len(top_performers) > 0:
-                    fig_top = px.bar(
-                        top_performers,
-                        x='AVG_HOURS_PER_PATIENT',
-                        y='FACILITY_NAME',
-                        orientation='h',
-                        color='AVG_HOURS_PER_PATIENT',
-                        color_continuous_scale='Greens_r',
-                        title="Top 10 Most Efficient Facilities"
-                    )
-                    fig_top.update_layout(
-                        height=400, 
-                        showlegend=False,
-                        yaxis_title="",
-                        xaxis_title="Hours per Patient"
-                    )
-                    st.plotly_chart(fig_top, use_container_width=True)
-                else:
-                    st.info("No data available for selected state")
-            
-            with col2:
-                st.markdown("### 🔴 Least Efficient Facilities")
-                st.caption("Highest nursing hours per patient")
-                
-                bottom_performers = filtered_df.nlargest(10, 'AVG_HOURS_PER_PATIENT')
-                
-                if len(bottom_performers) > 0:
-                    fig_bottom = px.bar(
-                        bottom_performers,
-                        x='AVG_HOURS_PER_PATIENT',
-                        y='FACILITY_NAME',
-                        orientation='h',
-                        color='AVG_HOURS_PER_PATIENT',
-                        color_continuous_scale='Reds',
-                        title="Top 10 Least Efficient Facilities"
-                    )
-                    fig_bottom.update_layout(
-                        height=400, 
-                        showlegend=False,
-                        yaxis_title="",
-                        xaxis_title="Hours per Patient"
-                    )
-                    st.plotly_chart(fig_bottom, use_container_width=True)
-                else:
-                    st.info("No data available for selected state")
-        
-        with tab2:
-            st.markdown("## 🗺️ State-Level Healthcare Performance")
-            
-            # State comparison chart
-            fig_states = px.bar(
-                state_df.sort_values('STATE_AVG_HOURS_PER_PATIENT'),
-                x='STATE',
-                y='STATE_AVG_HOURS_PER_PATIENT',
-                color='STATE_AVG_HOURS_PER_PATIENT',
-                color_continuous_scale='RdYlBu_r',
-                title="Average Nursing Hours per Patient by State",
-                labels={
-                    'STATE_AVG_HOURS_PER_PATIENT': 'Hours per Patient',
-                    'STATE': 'State'
-                }
-            )
-            fig_states.update_layout(height=500, showlegend=False)
-            st.plotly_chart(fig_states, use_container_width=True)
-            
-            # State performance metrics
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                best_state = state_df.loc[state_df['STATE_AVG_HOURS_PER_PATIENT'].idxmin()]
-                st.success(f"**🥇 Most Efficient State**\n\n{best_state['STATE']}\n\n{best_state['STATE_AVG_HOURS_PER_PATIENT']:.2f} hours/patient")
-            
-            with col2:
-                worst_state = state_df.loc[state_df['STATE_AVG_HOURS_PER_PATIENT'].idxmax()]
-                st.error(f"**📈 Least Efficient State**\n\n{worst_state['STATE']}\n\n{worst_state['STATE_AVG_HOURS_PER_PATIENT']:.2f} hours/patient")
-            
-            with col3:
-                efficiency_gap = worst_state['STATE_AVG_HOURS_PER_PATIENT'] - best_state['STATE_AVG_HOURS_PER_PATIENT']
-                st.info(f"**📊 Efficiency Gap**\n\n{efficiency_gap:.2f} hours/patient\n\nDifference between best and worst performing states")
-        
-        with tab3:
-            st.markdown("## 📊 Staffing Analysis")
-            
-            # Contract vs efficiency analysis
-            st.markdown("### Contract Staffing vs Efficiency")
-            
-            fig_scatter = px.scatter(
-                facility_df,
-                x='AVG_CONTRACT_PERCENTAGE',
-                y='AVG_HOURS_PER_PATIENT',
-                color='STATE',
-                size='AVG_PATIENT_CENSUS',
-                hover_data=['FACILITY_NAME'],
-                title="Relationship between Contract Staffing and Efficiency",
-                labels={
-                    'AVG_CONTRACT_PERCENTAGE': 'Contract Staff Percentage (%)',
-                    'AVG_HOURS_PER_PATIENT': 'Hours per Patient',
-                    'AVG_PATIENT_CENSUS': 'Patient Census'
-                }
-            )
-            fig_scatter.update_layout(height=500)
-            st.plotly_chart(fig_scatter, use_container_width=True)
-            
-            # RN percentage distribution
-            st.markdown("### RN Staffing Distribution")
-            
-            fig_rn = px.histogram(
-                facility_df,
-                x='AVG_RN_PERCENTAGE',
-                nbins=25,
-                title="Distribution of RN Staffing Percentage Across Facilities",
-                labels={
-                    'AVG_RN_PERCENTAGE': 'RN Percentage (%)',
-                    'count': 'Number of Facilities'
-                }
-            )
-            fig_rn.update_layout(height=400)
-            st.plotly_chart(fig_rn, use_container_width=True)
-            
-            # Insights section
-            st.markdown("### 🔍 Key Insights")
-            
-            # Contract staffing analysis
-            high_contract = facility_df[facility_df['AVG_CONTRACT_PERCENTAGE'] > 30]
-            low_contract = facility_df[facility_df['AVG_CONTRACT_PERCENTAGE'] <= 30]
-            
-            if len(high_contract) > 0 and len(low_contract) > 0:
-                high_avg = high_contract['AVG_HOURS_PER_PATIENT'].mean()
-                low_avg = low_contract['AVG_HOURS_PER_PATIENT'].mean()
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.metric(
-                        label="High Contract Facilities (>30%)",
-                        value=f"{high_avg:.2f} hrs/patient",
-                        help=f"Average efficiency for {len(high_contract)} facilities with >30% contract staff"
-                    )
-                
-                with col2:
-                    st.metric(
-                        label="Low Contract Facilities (≤30%)",
-                        value=f"{low_avg:.2f} hrs/patient",
-                        delta=f"{low_avg - high_avg:.2f}",
-                        help=f"Average efficiency for {len(low_contract)} facilities with ≤30% contract staff"
-                    )
-                
-                if high_avg > low_avg:
-                    st.warning(f"💡 **Insight**: Facilities with higher contract staff usage show {high_avg - low_avg:.2f} more hours per patient on average, suggesting potential efficiency challenges with contract staffing.")
-                else:
-                    st.success(f"💡 **Insight**: Facilities with higher contract staff usage are {low_avg - high_avg:.2f} hours more efficient per patient, indicating effective contract staff utilization.")
-        
-        with tab4:
-            st.markdown("## 📋 Data Tables")
-            
-            # Facility data table
-            st.markdown("### Facility Performance Data")
-            st.caption(f"Complete data for {len(facility_df)} healthcare facilities")
-            
-            # Add search functionality
-            search_term = st.text_input("🔍 Search facilities:", placeholder="Enter facility name or state...")
-            
-            if search_term:
-                filtered_table = facility_df[
-                    facility_df['FACILITY_NAME'].str.contains(search_term, case=False, na=False) |
-                    facility_df['STATE'].str.contains(search_term, case=False, na=False)
-                ]
-            else:
-                filtered_table = facility_df
-            
-            # Sort options
-            sort_column = st.selectbox(
-                "Sort by:",
-                ['AVG_HOURS_PER_PATIENT', 'AVG_CONTRACT_PERCENTAGE', 'AVG_PATIENT_CENSUS', 'FACILITY_NAME'],
-                key="sort_option"
-            )
-            
-            sort_order = st.radio("Sort order:", ['Ascending', 'Descending'], horizontal=True)
-            
-            if sort_order == 'Ascending':
-                filtered_table = filtered_table.sort_values(sort_column)
-            else:
-                filtered_table = filtered_table.sort_values(sort_column, ascending=False)
-            
-            st.dataframe(filtered_table, use_container_width=True, height=400)
-            
-            # State benchmarks table
-            st.markdown("### State Benchmark Data")
-            st.caption(f"Comparative performance across {len(state_df)} states")
-            
-            state_table = state_df.sort_values('STATE_AVG_HOURS_PER_PATIENT')
-            st.dataframe(state_table, use_container_width=True)
+        # Only the selected section runs; widgets inside a section rerun just that section
+        sections = {
+            "🏥 Facility Performance": facility_performance_section,
+            "🗺️ State Analysis": lambda: state_analysis_section(state_df),
+            "📊 Staffing Analysis": lambda: staffing_analysis_section(total_facilities),
+            "📋 Data Tables": lambda: data_tables_section(total_facilities, state_df),
+            "🔎 Trend Drill-down": lambda: trend_drilldown_section(state_df)
+        }
+        active_section = st.radio(
+            "Section:", list(sections), horizontal=True, label_visibility="collapsed", key="active_section"
+        )
+        sections[active_section]()
     
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
@@ -382,6 +758,8 @@ else:
     
     st.info("🎯 **Your complete healthcare analytics platform is ready!** Connect above to explore nursing staffing insights and facility performance metrics.")
 
+render_profiling_panel()
+
 # Footer
 st.markdown("---")
 st.markdown("**🏥 Healthcare Analytics Dashboard** | Built with Streamlit, Snowflake & dbt | Real-time healthcare insights")